@@ -0,0 +1,4 @@
+"""
+Scripts used by the SLATE GitHub Actions workflows, installed as one package and run
+through the ``slate-gitops`` command, see cli.py.
+"""
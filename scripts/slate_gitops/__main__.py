@@ -0,0 +1,7 @@
+"""
+Allows running the command line interface with ``python -m slate_gitops``.
+"""
+
+from .cli import main
+
+main()
@@ -0,0 +1,59 @@
+"""
+Shared semantic version logic for the chart ``appVersion`` scripts: reading ``Chart.yaml``,
+comparing the source version with the deployed one and bumping the deployed version.
+"""
+
+import os
+from datetime import datetime
+
+import semver
+import yaml
+
+
+def read_app_version(chart_path: str) -> str:
+    """
+    Read the ``appVersion`` of a chart.
+    :param chart_path: the chart directory or its ``Chart.yaml``
+    :return: the appVersion
+    """
+
+    if os.path.isdir(chart_path):
+        chart_path = os.path.join(chart_path, "Chart.yaml")
+    with open(chart_path) as stream:
+        return str(yaml.safe_load(stream)["appVersion"])
+
+
+def is_ahead(source_appversion: str, deployed_appversion: str) -> bool:
+    """
+    Check whether the source appVersion is newer than the deployed one.
+    :param source_appversion: the appVersion in Chart.yaml
+    :param deployed_appversion: the appVersion of the deployed release
+    :return: True if the source appVersion is ahead
+    """
+
+    return semver.compare(source_appversion, deployed_appversion) >= 1
+
+
+def bump_version(deployed_appversion: str, namespace: str, prerelease_datetime_suffix: str = None) -> str:
+    """
+    Get the next appVersion after a deployed one.
+
+    In the development namespace the finalized version (or the next patch, if the deployed version is
+    already final) gets a ``pre.<datetime>`` pre-release suffix, elsewhere the patch version is bumped.
+    :param deployed_appversion: the appVersion of the deployed release
+    :param namespace: the namespace of the release
+    :param prerelease_datetime_suffix: strftime format of the development pre-release suffix
+    :return: the new appVersion
+    """
+
+    deployed_versioninfo = semver.VersionInfo.parse(deployed_appversion)
+
+    if namespace == 'development':
+        new_versioninfo = deployed_versioninfo.finalize_version()
+        if semver.compare(str(new_versioninfo), str(deployed_appversion)) == 0:
+            new_versioninfo = deployed_versioninfo.finalize_version().bump_patch()
+
+        date_time = datetime.now().strftime(prerelease_datetime_suffix)
+        return f"{str(new_versioninfo)}-pre.{date_time}"
+
+    return str(deployed_versioninfo.finalize_version().bump_patch())
@@ -0,0 +1,52 @@
+"""
+Command line interface of the SLATE GitOps automation, each script is a subcommand::
+
+    slate-gitops push-updates SLATE_TOKEN SLATE_API_ENDPOINT --git-diff BEFORE AFTER
+    slate-gitops notify BEFORE..AFTER
+    slate-gitops semver-compare
+
+The arguments after the subcommand are passed on to its module, which is run as
+``__main__`` the same way ``python -m slate_gitops.<module>`` would run it. Modules are
+only imported once their subcommand has been chosen, so a step only loads the
+dependencies of the command it runs, e.g. ``semver-compare`` never imports
+``requests`` or ``jinja2``.
+"""
+
+import argparse
+import runpy
+import sys
+from typing import List
+
+# Subcommands and the modules that implement them
+COMMANDS = {
+    "mail-body": "mail_body",
+    "mailgun": "mailgun",
+    "notify": "notify",
+    "push-updates": "push_updates",
+    "schema-validate": "schema_validate",
+    "semver-batch": "semver_batch",
+    "semver-bump": "semver_bump",
+    "semver-compare": "semver_compare",
+}
+
+
+def main(argv: List[str] = None) -> None:
+    """
+    Run the subcommand given on the command line
+
+    :param argv: the arguments, None to use sys.argv
+    :return: None, the subcommand exits with its own status
+    """
+    parser = argparse.ArgumentParser(prog="slate-gitops",
+                                     description="Run one of the SLATE GitOps automation scripts.")
+    parser.add_argument("command", choices=list(COMMANDS), help="the script to run")
+    parser.add_argument("args", nargs=argparse.REMAINDER,
+                        help="arguments of the script, see slate-gitops COMMAND --help")
+    args = parser.parse_args(argv)
+
+    sys.argv = [f"{parser.prog} {args.command}", *args.args]
+    runpy.run_module(f"{__package__}.{COMMANDS[args.command]}", run_name="__main__", alter_sys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Small GitHub REST API client used by the GitOps mail scripts.
+
+Responses are stored on disk keyed by URL and revalidated with ETag /
+If-None-Match, so repeated requests that GitHub answers with 304 don't count
+against the rate limit. Commit objects addressed by their full SHA never change
+and are served from the cache without contacting GitHub at all. When the rate
+limit is exhausted the client waits for X-RateLimit-Reset before trying again.
+
+This module uses the following optional system environmental variables:
+
+* ``GITHUB_TOKEN``: token used to authenticate requests.
+* ``GITHUB_API_CACHE_DIR``: directory for cached responses, defaults to ``~/.cache/slate-github-api``.
+* ``GITHUB_API_MAX_WAIT``: longest time in seconds to wait for the rate limit to reset, defaults to 120.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Any, Iterator, Optional, Tuple
+from urllib.parse import urlencode
+
+import requests
+
+ACCEPT = "application/vnd.github.v3+json"
+
+# URLs of commit objects and comparisons addressed by full SHAs, their content never changes
+IMMUTABLE_URL = re.compile(r"/(commits/[0-9a-f]{40}|compare/[0-9a-f]{40}\.\.\.[0-9a-f]{40})$")
+
+
+class GitHubAPIError(Exception):
+    """
+    Raised when GitHub answers with an error
+    """
+
+    def __init__(self, url: str, status: int, text: str):
+        """
+        :param url: URL requested
+        :param status: HTTP status code
+        :param text: response body
+        """
+        super().__init__(f"GET {url} got HTTP code {status}: {text}")
+        self.status = status
+        self.text = text
+
+
+class GitHubClient:
+    """
+    GitHub REST API client with an on-disk conditional request cache
+    """
+
+    def __init__(self, token: str = None, cache_dir: str = None, max_wait: float = None,
+                 session: requests.Session = None):
+        """
+        :param token: token used to authenticate requests
+        :param cache_dir: directory for cached responses, None to use the environment or default
+        :param max_wait: longest time in seconds to wait for the rate limit to reset
+        :param session: session to send requests with, it may be shared with other APIs
+        """
+        self.session = session if session is not None else requests.Session()
+        # headers are sent per request so the token never leaks to other hosts using the session
+        self.headers = {"Accept": ACCEPT, "X-GitHub-Api-Version": "2022-11-28"}
+        token = token if token is not None else os.environ.get("GITHUB_TOKEN")
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.cache_dir = cache_dir or os.environ.get("GITHUB_API_CACHE_DIR") or \
+            os.path.join(os.path.expanduser("~"), ".cache", "slate-github-api")
+        self.max_wait = max_wait if max_wait is not None else float(os.environ.get("GITHUB_API_MAX_WAIT", 120))
+        self.rate_limit_reset: Optional[float] = None
+
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_cache(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._cache_path(url)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def _write_cache(self, url: str, etag: str, body: Any, next_url: Optional[str]) -> None:
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"url": url, "etag": etag, "body": body, "next": next_url}, f)
+            os.replace(temp_path, self._cache_path(url))
+        except OSError as e:
+            logging.warning(f"Can't cache response for {url}: {e}")
+
+    def _wait_for_rate_limit(self) -> None:
+        if self.rate_limit_reset is None:
+            return
+        wait = self.rate_limit_reset - time.time()
+        self.rate_limit_reset = None
+        if wait <= 0:
+            return
+        if wait > self.max_wait:
+            raise GitHubAPIError("(rate limited)", 403, f"rate limit resets in {wait:.0f}s")
+        logging.warning(f"GitHub API rate limit exhausted, waiting {wait:.0f}s for it to reset")
+        time.sleep(wait)
+
+    def _send(self, url: str, params: Optional[dict], headers: dict) -> requests.Response:
+        for attempt in range(2):
+            self._wait_for_rate_limit()
+            r = self.session.get(url, params=params, headers={**self.headers, **headers}, timeout=(10, 60))
+            if r.headers.get("X-RateLimit-Remaining") == "0" and r.headers.get("X-RateLimit-Reset", "").isdigit():
+                self.rate_limit_reset = float(r.headers["X-RateLimit-Reset"]) + 1
+                if r.status_code in (403, 429) and attempt == 0:
+                    continue
+            return r
+        return r
+
+    def _get(self, url: str, params: Optional[dict]) -> Tuple[Any, Optional[str]]:
+        key = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+        immutable = IMMUTABLE_URL.search(url) is not None
+        cached = self._read_cache(key)
+        if cached is not None and immutable:
+            logging.debug(f"Using cached {key}")
+            return cached["body"], cached.get("next")
+        headers = {"If-None-Match": cached["etag"]} if cached is not None and cached.get("etag") else {}
+        r = self._send(url, params, headers)
+        if r.status_code == requests.codes.not_modified and cached is not None:
+            logging.debug(f"{key} not modified, using cached copy")
+            return cached["body"], cached.get("next")
+        if r.status_code != requests.codes.ok:
+            raise GitHubAPIError(url, r.status_code, r.text)
+        body = r.json()
+        next_url = r.links.get("next", {}).get("url")
+        if r.headers.get("ETag") or immutable:
+            self._write_cache(key, r.headers.get("ETag", ""), body, next_url)
+        return body, next_url
+
+    def get_json(self, url: str, params: dict = None) -> Any:
+        """
+        GET a JSON document, using the cache where possible
+
+        :param url: full API URL
+        :param params: query parameters
+        :return: the decoded JSON body
+        :raises GitHubAPIError: if GitHub answers with an error
+        """
+        return self._get(url, params)[0]
+
+    def iter_pages(self, url: str, params: dict = None) -> Iterator[Any]:
+        """
+        Lazily GET every page of a paginated resource, following the Link headers
+
+        :param url: full API URL of the first page
+        :param params: query parameters for the first page
+        :return: iterator of decoded JSON pages, the next page is only requested when needed
+        :raises GitHubAPIError: if GitHub answers with an error
+        """
+        next_url: Optional[str] = url
+        while next_url:
+            body, next_url = self._get(next_url, params)
+            params = None
+            yield body
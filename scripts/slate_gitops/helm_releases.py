@@ -0,0 +1,111 @@
+"""
+Shared discovery of deployed Helm releases for the semver scripts.
+
+``helm list --output json`` is run at most once per namespace per job. The result is cached in a
+JSON file that later steps of the same job reuse, and releases are selected by their exact name
+instead of by their position in the filtered output.
+
+This module uses the following optional system environmental variables:
+
+* ``HELM_RELEASES_CACHE``: cache file, defaults to ``helm-releases.json`` in ``RUNNER_TEMP`` (which
+  GitHub Actions clears after every job). Without either, e.g. when run locally, nothing is cached
+  and every call runs helm.
+
+Additionally, the tools installed and configured by the GitHub composite action
+``gcloud-helm-setup/action.yml`` are required.
+"""
+
+import json
+import logging
+import os
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+HELM_RELEASES_CACHE: Optional[str] = os.environ.get('HELM_RELEASES_CACHE') or \
+    (os.path.join(os.environ['RUNNER_TEMP'], "helm-releases.json") if os.environ.get('RUNNER_TEMP') else None)
+# cache key of a listing across all namespaces
+ALL_NAMESPACES = "*"
+
+
+def _read_cache() -> Dict[str, List[dict]]:
+    if HELM_RELEASES_CACHE is None:
+        return {}
+    try:
+        with open(HELM_RELEASES_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache: Dict[str, List[dict]]) -> None:
+    if HELM_RELEASES_CACHE is None:
+        return
+    directory = os.path.dirname(os.path.abspath(HELM_RELEASES_CACHE))
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f)
+        os.replace(temp_path, HELM_RELEASES_CACHE)
+    except OSError as e:
+        logging.warning(f"Can't cache the Helm releases in {HELM_RELEASES_CACHE}: {e}")
+
+
+def list_releases(namespace: str = None) -> List[dict]:
+    """
+    Get the deployed releases of a namespace, running helm only if this job hasn't yet.
+    :param namespace: the namespace, None for all namespaces
+    :return: the releases as returned by ``helm list --output json``
+    :raises subprocess.CalledProcessError: if helm fails
+    """
+
+    key = namespace or ALL_NAMESPACES
+    cache = _read_cache()
+    if key in cache:
+        logging.debug(f"Using cached Helm releases for {key} from {HELM_RELEASES_CACHE}")
+        return cache[key]
+    if ALL_NAMESPACES in cache:
+        return [release for release in cache[ALL_NAMESPACES] if release.get('namespace') == namespace]
+
+    # --max 0 lifts helm's default limit of 256 releases, which would silently truncate the listing
+    command = ['helm', 'list', '--output', 'json', '--max', '0']
+    command += ['--all-namespaces'] if namespace is None else ['-n', namespace]
+    logging.info(f"Discovering deployed Helm releases in {'all namespaces' if namespace is None else namespace}...")
+    result = subprocess.run(command,
+                            stdout=subprocess.PIPE,
+                            check=True,
+                            text=True
+                            ).stdout
+    logging.debug(f"Raw result from Helm:\n{result}")
+    releases = json.loads(result) or []
+    cache[key] = releases
+    _write_cache(cache)
+    return releases
+
+
+def index_releases(releases: List[dict]) -> Dict[tuple, dict]:
+    """
+    Index releases by namespace and name.
+    :param releases: the releases as returned by ``helm list --output json``
+    :return: the releases keyed by (namespace, name)
+    """
+
+    return {(release.get('namespace'), release['name']): release for release in releases}
+
+
+def find_release(name: str, namespace: str) -> dict:
+    """
+    Get a deployed release by its exact name.
+    :param name: the release name
+    :param namespace: the namespace of the release
+    :return: the release as returned by ``helm list --output json``
+    :raises LookupError: if no release has that name
+    """
+
+    releases = list_releases(namespace)
+    release = index_releases(releases).get((namespace, name))
+    if release is None:
+        similar = [other['name'] for other in releases if name in other['name']]
+        raise LookupError(f"No Helm release named {name} in the {namespace} namespace" +
+                          (f", similar releases: {', '.join(similar)}." if similar else "."))
+    return release
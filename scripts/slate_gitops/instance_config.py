@@ -0,0 +1,147 @@
+"""
+Shared reader and writer for the instance.yaml files describing SLATE instances in a
+GitOps repository.
+
+instance.yaml is a flat list of ``key: value`` lines, e.g.::
+
+    cluster: uchicago-prod
+    group: slate-dev
+    app: squid
+    appVersion: 1.0.0
+    instance: instance_abc123
+
+Parsed files are memoized per directory for the rest of the run, writing a file
+through this module drops its cached copy.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict
+
+INSTANCE_FILE = "instance.yaml"
+
+
+class InstanceConfig:
+    """
+    Contents of an instance.yaml file
+    """
+    __slots__ = ("cluster", "group", "app", "appVersion", "instance", "valuesDigest")
+
+    def __init__(self, cluster: str = "", group: str = "", app: str = "", appVersion: str = "",
+                 instance: str = "", valuesDigest: str = ""):
+        self.cluster = cluster
+        self.group = group
+        self.app = app
+        self.appVersion = appVersion
+        self.instance = instance
+        self.valuesDigest = valuesDigest
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{key}={getattr(self, key)!r}" for key in self.__slots__ if getattr(self, key))
+        return f"InstanceConfig({fields})"
+
+    @classmethod
+    def parse(cls, text: str, source: str = INSTANCE_FILE) -> "InstanceConfig":
+        """
+        Parse the text of an instance.yaml file
+
+        Values are split from keys at the first colon, so values containing colons
+        (e.g. URLs) are kept whole.
+
+        :param text: contents of the file
+        :param source: file name used in warnings
+        :return: InstanceConfig
+        """
+        config = cls()
+        for line in text.splitlines():
+            if line.strip() == "" or line.lstrip().startswith("#"):
+                continue
+            key, separator, value = line.partition(":")
+            if not separator:
+                logging.warning(f"Skipping malformed line in {source}: {line}")
+                continue
+            key = key.strip()
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+                value = value[1:-1]
+            if key in cls.__slots__:
+                setattr(config, key, value)
+            else:
+                logging.debug(f"Ignoring unknown key {key} in {source}")
+        return config
+
+
+_cache: Dict[str, InstanceConfig] = {}
+_cache_lock = threading.Lock()
+
+
+def _key(directory: str) -> str:
+    return os.path.normpath(directory)
+
+
+def load_instance_config(directory: str) -> InstanceConfig:
+    """
+    Read the instance.yaml in an instance directory, memoized per directory
+
+    :param directory: path to the instance directory
+    :return: InstanceConfig
+    :raises OSError: if the file can't be read
+    """
+    key = _key(directory)
+    with _cache_lock:
+        config = _cache.get(key)
+    if config is None:
+        path = os.path.join(directory, INSTANCE_FILE)
+        with open(path, "r") as f:
+            config = InstanceConfig.parse(f.read(), path)
+        with _cache_lock:
+            _cache[key] = config
+    return config
+
+
+def invalidate(directory: str) -> None:
+    """
+    Drop the memoized instance.yaml of a directory
+
+    :param directory: path to the instance directory
+    """
+    with _cache_lock:
+        _cache.pop(_key(directory), None)
+
+
+def write_instance_fields(directory: str, fields: Dict[str, str]) -> None:
+    """
+    Set key value pairs in an instance.yaml, replacing existing keys in place
+
+    The new contents are written to a temporary file that is renamed over the
+    original, so a crash never leaves a half-written instance.yaml behind.
+
+    :param directory: path to the instance directory
+    :param fields: keys and values to write
+    :raises OSError: if the file can't be read or written
+    """
+    path = os.path.join(directory, INSTANCE_FILE)
+    try:
+        with open(path, "r") as f:
+            lines = f.read().splitlines()
+        remaining = dict(fields)
+        for i, line in enumerate(lines):
+            key, separator, _ = line.partition(":")
+            if separator and key.strip() in remaining:
+                lines[i] = f"{key.strip()}: {remaining.pop(key.strip())}"
+        lines.extend(f"{key}: {value}" for key, value in remaining.items())
+        fd, temp_path = tempfile.mkstemp(prefix=f".{INSTANCE_FILE}.", dir=directory or ".")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    finally:
+        invalidate(directory)
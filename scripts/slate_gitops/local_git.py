@@ -0,0 +1,176 @@
+"""
+Read commits and comparisons from a local git checkout in the same shape as the
+GitHub REST API returns them, so the mail scripts can run without network access.
+
+Only the fields used by mail_body.py are filled in: ``sha``, ``parents``,
+``html_url``, ``commit.author.name``, ``commit.author.date``, ``commit.message`` and
+``files`` with ``filename``, ``status``, ``additions``, ``deletions``, ``changes`` and
+``patch``.
+
+This module uses the following optional system environmental variables:
+
+* ``GITHUB_SERVER_URL`` and ``GITHUB_REPOSITORY``: used to build the ``html_url`` links,
+  both are set by GitHub Actions.
+"""
+
+import os
+import subprocess
+from typing import List, Optional, Sequence
+
+# tree object of an empty directory, used as the parent of root commits
+EMPTY_TREE_ID = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+# separates the fields of one commit in git log output, NUL separates commits
+FIELD_SEPARATOR = "\x1f"
+LOG_FORMAT = FIELD_SEPARATOR.join(["%H", "%P", "%an", "%aI", "%B"])
+DIFF_STATUS = {"A": "added", "D": "removed", "M": "modified", "T": "changed"}
+
+
+class LocalGitError(Exception):
+    """
+    Raised when the local checkout can't answer a query
+    """
+
+
+class LocalGitRepository:
+    """
+    Commit and comparison lookups against a local git checkout
+    """
+
+    def __init__(self, path: str = ".", html_url: str = None, max_patch_changes: int = None):
+        """
+        :param path: path inside the git work tree
+        :param html_url: base URL of the repository on GitHub, None to use the environment
+        :param max_patch_changes: leave out the patch of files with more changed lines, None to keep all
+        """
+        self.path = path
+        self.max_patch_changes = max_patch_changes
+        if html_url is None and os.environ.get("GITHUB_SERVER_URL") and os.environ.get("GITHUB_REPOSITORY"):
+            html_url = f"{os.environ['GITHUB_SERVER_URL']}/{os.environ['GITHUB_REPOSITORY']}"
+        self.html_url = html_url
+
+    def _command(self, *args: str) -> List[str]:
+        return ["git", "-C", self.path, "-c", "core.quotePath=false", *args]
+
+    def _git(self, *args: str) -> str:
+        try:
+            result = subprocess.run(self._command(*args), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        except FileNotFoundError as e:
+            raise LocalGitError(f"git is not available: {e}") from e
+        except subprocess.CalledProcessError as e:
+            raise LocalGitError(f"git {args[0]} failed: {e.stderr.decode('utf-8', 'replace').strip()}") from e
+        return result.stdout.decode("utf-8", "replace")
+
+    def _patches(self, revisions: Sequence[str], options: List[str], files: List[dict]) -> None:
+        """
+        Stream the patch output and attach the hunks of each file to its entry in files
+
+        The patch output lists the files in the same order as numstat, so a file's
+        hunks are matched up by position. Hunks of files with more changed lines than
+        max_patch_changes are skipped while reading, so large diffs are never held
+        in memory.
+        """
+        index = -1
+        hunks: Optional[List[str]] = None
+        try:
+            with subprocess.Popen(self._command("diff", *options, *revisions), stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL) as process:
+                for raw_line in process.stdout:
+                    line = raw_line.decode("utf-8", "replace").rstrip("\n")
+                    if line.startswith("diff --git "):
+                        if hunks:
+                            files[index]["patch"] = "\n".join(hunks)
+                        index += 1
+                        hunks = None
+                        continue
+                    if hunks is not None:
+                        hunks.append(line)
+                    elif line.startswith("@@") and index < len(files) and \
+                            (self.max_patch_changes is None or files[index]["changes"] <= self.max_patch_changes):
+                        hunks = [line]
+                if hunks:
+                    files[index]["patch"] = "\n".join(hunks)
+        except FileNotFoundError as e:
+            raise LocalGitError(f"git is not available: {e}") from e
+        if process.returncode != 0:
+            raise LocalGitError(f"git diff failed with exit code {process.returncode}")
+
+    def _url(self, path: str) -> str:
+        return f"{self.html_url}/{path}" if self.html_url else path
+
+    def _commit(self, record: str) -> dict:
+        sha, parents, author, date, message = record.split(FIELD_SEPARATOR, 4)
+        return {"sha": sha,
+                "html_url": self._url(f"commit/{sha}"),
+                "parents": [{"sha": parent} for parent in parents.split()],
+                "commit": {"author": {"name": author, "date": date},
+                           "message": message.rstrip("\n")}}
+
+    def _files(self, *revisions: str) -> List[dict]:
+        """
+        Diff two revisions, or the merge base of base...head against head
+
+        The name-status and numstat outputs list the files in the same order, so they
+        are matched up by position.
+        """
+        options = ["--no-renames", "--no-color", "--no-ext-diff"]
+        statuses = self._git("diff", "--name-status", "-z", *options, *revisions).split("\0")
+        numstats = self._git("diff", "--numstat", "-z", *options, *revisions).split("\0")
+        files = []
+        for i, numstat in enumerate(filter(None, numstats)):
+            added, deleted, filename = numstat.split("\t", 2)
+            additions = int(added) if added.isdigit() else 0
+            deletions = int(deleted) if deleted.isdigit() else 0
+            changed_file = {"filename": filename,
+                            "status": DIFF_STATUS.get(statuses[2 * i][:1], "modified"),
+                            "additions": additions,
+                            "deletions": deletions,
+                            "changes": additions + deletions}
+            files.append(changed_file)
+        self._patches(revisions, options, files)
+        return files
+
+    def get_commit(self, sha: str) -> dict:
+        """
+        Get a commit and the files it changed relative to its first parent
+
+        :param sha: commit to read
+        :return: dict shaped like the GitHub commit API response
+        :raises LocalGitError: if the commit can't be read
+        """
+        commit = self._commit(self._git("log", "-1", f"--format={LOG_FORMAT}", sha, "--"))
+        base = commit["parents"][0]["sha"] if commit["parents"] else EMPTY_TREE_ID
+        commit["files"] = self._files(base, commit["sha"])
+        return commit
+
+    def compare(self, base: str, head: str) -> dict:
+        """
+        Compare two commits the way GitHub's base...head compare does
+
+        :param base: commit the changes are compared against
+        :param head: last commit of the changes
+        :return: dict shaped like the GitHub compare API response, with every commit on one page
+        :raises LocalGitError: if either commit can't be read
+        """
+        records = self._git("log", "-z", "--reverse", f"--format={LOG_FORMAT}", f"{base}..{head}", "--")
+        commits = [self._commit(record) for record in records.split("\0") if record]
+        return {"html_url": self._url(f"compare/{base}...{head}"),
+                "total_commits": len(commits),
+                "commits": commits,
+                "files": self._files(f"{base}...{head}")}
+
+
+def discover(path: str = ".", **kwargs) -> Optional[LocalGitRepository]:
+    """
+    Get the local checkout containing a path
+
+    :param path: path that may be inside a git work tree
+    :param kwargs: further LocalGitRepository arguments
+    :return: LocalGitRepository or None if the path isn't in a git work tree
+    """
+    repository = LocalGitRepository(path, **kwargs)
+    try:
+        if repository._git("rev-parse", "--is-inside-work-tree").strip() == "true":
+            return repository
+    except LocalGitError:
+        pass
+    return None
@@ -0,0 +1,331 @@
+"""
+Builds the body of the change summary email sent using mailgun, shared by
+the ``mail-body`` and ``notify`` commands.
+
+Commits are read from the git checkout in the current directory when it contains
+them, the GitHub API is used as a fallback. Set ``MAIL_BODY_SOURCE`` to ``git`` or
+``api`` to only use one of them.
+
+Originally written by Suchandra Thapa
+"""
+
+import itertools
+import math
+import os
+import sys
+from typing import Callable, Optional, Tuple
+
+import jinja2
+import requests
+
+from .github_api import GitHubAPIError, GitHubClient
+from .instance_config import load_instance_config
+from .local_git import LocalGitError, LocalGitRepository, discover
+
+GITHUB_API_COMMIT_ENDPOINT = os.environ.get('GITHUB_API_COMMIT_ENDPOINT')
+GITHUB_API_REPO_ENDPOINT = GITHUB_API_COMMIT_ENDPOINT.rsplit('/commits', 1)[0] if GITHUB_API_COMMIT_ENDPOINT else None
+# commits per page of a compare response, the files are all returned with the first page
+COMPARE_PAGE_SIZE = 100
+# before SHA GitHub sends for a push that creates a branch
+ZERO_COMMIT_ID = "0" * 40
+MAIL_BODY_SOURCE = os.environ.get('MAIL_BODY_SOURCE', 'auto')
+# the templates only show patches of files with at most PATCH_MAX_FILE_CHANGES changed lines,
+# and only if the whole change has at most PATCH_MAX_TOTAL_CHANGES changed lines
+PATCH_MAX_FILE_CHANGES = 30
+PATCH_MAX_TOTAL_CHANGES = 100
+TEMPLATE_CACHE_DIR = os.environ.get('MAIL_TEMPLATE_CACHE_DIR') or \
+    os.path.join(os.path.expanduser("~"), ".cache", "slate-mail-templates")
+
+github: Optional[GitHubClient] = None
+local_repo = None
+template_env: Optional[jinja2.Environment] = None
+
+
+def init(session: requests.Session = None) -> None:
+    """
+    Set up the GitHub API client and local checkout commits are read from
+
+    :param session: session to send GitHub API requests with, None for a new one
+    :return: None
+    """
+    global github, local_repo
+    github = GitHubClient(session=session)
+    local_repo = discover(max_patch_changes=PATCH_MAX_FILE_CHANGES) if MAIL_BODY_SOURCE != 'api' else None
+
+
+def read_local(query: Callable[..., dict], *args: str) -> Optional[dict]:
+    """
+    Run a LocalGitRepository query against the checkout
+
+    :param query: unbound LocalGitRepository method to run
+    :param args: arguments for the query
+    :return: dict shaped like the GitHub API response or None to use the API instead
+    """
+    if local_repo is None:
+        if MAIL_BODY_SOURCE == 'git':
+            sys.stderr.write("MAIL_BODY_SOURCE is git but the current directory isn't a git checkout\n")
+            sys.exit(1)
+        return None
+    try:
+        return query(local_repo, *args)
+    except LocalGitError as e:
+        if MAIL_BODY_SOURCE == 'git':
+            sys.stderr.write(f"{e}\n")
+            sys.exit(1)
+        sys.stderr.write(f"{e}, falling back to the GitHub API\n")
+        return None
+
+
+def get_cluster(instance_dir: str = None) -> str:
+    """
+    Get the instance information given a path to the directory
+
+    :param instance_dir: path to directory
+    :return:  string with name of cluster
+    """
+    if not instance_dir:
+        return "Unknown Cluster"
+    try:
+        return load_instance_config(instance_dir).cluster or instance_dir
+    except OSError:
+        return instance_dir
+
+
+def get_git_commit(commit_id: str = None) -> dict:
+    """
+    Get commit information given a commit
+    :param commit_id: sha hash for commit
+    :return: dict with json response
+    """
+    body = read_local(LocalGitRepository.get_commit, commit_id)
+    if body is None:
+        try:
+            body = github.get_json(f"{GITHUB_API_COMMIT_ENDPOINT}/{commit_id}")
+        except GitHubAPIError as e:
+            sys.stderr.write(f"Can't get commit {commit_id} got HTTP code {e.status}: {e.text}\n")
+            sys.exit(1)
+    body_vars = {"author": body['commit']['author']['name'],
+                 "date": body['commit']['author']['date'],
+                 "message": body['commit']['message'],
+                 "commit_url": body['html_url'],
+                 "sites": [],
+                 "changes": [],
+                 "files": body["files"],
+                 "parents": [parent["sha"] for parent in body.get("parents", [])]}
+    return body_vars
+
+
+def get_prior_commit(commit_id: str = None, parents: list = None) -> dict:
+    """
+    Get the message and combined changes of the branch brought in by a merge commit
+
+    The merge is compared against its first parent, which returns the files changed
+    by the merge and the merged commits in one request. The merged commits are
+    paginated, if the merged branch head isn't on the first page it is on the last
+    one, so at most two requests are made.
+
+    :param commit_id: sha hash of merge commit
+    :param parents: sha hashes of the merge commit's parents
+    :return: dict with message, files and commit_url of the merged changes
+    """
+    prior_commit = {"message": f"Can't find commit prior to merge commit: {commit_id}",
+                    "files": []}
+    if not parents:
+        return prior_commit
+    branch_head = parents[-1]
+    compare = read_local(LocalGitRepository.compare, parents[0], commit_id)
+    if compare is not None:
+        commits = compare["commits"]
+    else:
+        compare_url = f"{GITHUB_API_REPO_ENDPOINT}/compare/{parents[0]}...{commit_id}"
+        try:
+            compare = github.get_json(compare_url, params={"per_page": COMPARE_PAGE_SIZE})
+            commits = compare["commits"]
+            last_page = math.ceil(compare.get("total_commits", 0) / COMPARE_PAGE_SIZE)
+            if last_page > 1 and all(commit["sha"] != branch_head for commit in commits):
+                commits = github.get_json(compare_url, params={"per_page": COMPARE_PAGE_SIZE,
+                                                               "page": last_page})["commits"]
+        except GitHubAPIError as e:
+            sys.stderr.write(f"Can't compare {parents[0]}...{commit_id} got HTTP code {e.status}: {e.text}\n")
+            sys.exit(1)
+    prior_commit["files"] = compare.get("files", [])
+    prior_commit["commit_url"] = compare["html_url"]
+    for commit in reversed(commits):
+        if commit["sha"] == branch_head:
+            prior_commit["message"] = commit["commit"]["message"]
+            break
+    else:
+        if commits:
+            prior_commit["message"] = commits[-1]["commit"]["message"]
+    return prior_commit
+
+
+def get_commit_range(before: str, after: str) -> dict:
+    """
+    Get the combined changes of all commits pushed between two commits
+
+    The range is fetched with one local git comparison or compare request, further pages of commits are
+    only requested when the push has more than COMPARE_PAGE_SIZE commits. Merge
+    commits are left out of the commit list, their changes are part of the files.
+
+    :param before: sha hash of the commit before the push
+    :param after: sha hash of the last commit pushed
+    :return: dict with the same keys as get_git_commit plus commits and authors
+    """
+    commits = []
+    authors = {}
+    try:
+        compare = read_local(LocalGitRepository.compare, before, after)
+        if compare is not None:
+            pages = iter([])
+        else:
+            pages = github.iter_pages(f"{GITHUB_API_REPO_ENDPOINT}/compare/{before}...{after}",
+                                      params={"per_page": COMPARE_PAGE_SIZE})
+            compare = next(pages)
+        for page in itertools.chain([compare], pages):
+            for commit in page["commits"]:
+                if len(commit.get("parents", [])) > 1:
+                    continue
+                author = commit["commit"]["author"]["name"]
+                commit_info = {"sha": commit["sha"],
+                               "author": author,
+                               "date": commit["commit"]["author"]["date"],
+                               "message": commit["commit"]["message"],
+                               "summary": commit["commit"]["message"].partition("\n")[0],
+                               "commit_url": commit["html_url"]}
+                commits.append(commit_info)
+                authors.setdefault(author, []).append(commit_info)
+    except GitHubAPIError as e:
+        sys.stderr.write(f"Can't compare {before}...{after} got HTTP code {e.status}: {e.text}\n")
+        sys.exit(1)
+    last_commit = commits[-1] if commits else {"author": "Unknown", "date": "", "message": ""}
+    return {"author": ", ".join(authors) or last_commit["author"],
+            "date": last_commit["date"],
+            "message": last_commit["message"],
+            "commit_url": compare["html_url"],
+            "sites": [],
+            "changes": [],
+            "files": compare.get("files", []),
+            "parents": [],
+            "commits": commits,
+            "authors": [{"name": name, "commits": author_commits} for name, author_commits in authors.items()]}
+
+
+def get_commit_vars(commit_id: str = None) -> dict:
+    """
+    Get the template variables for a commit id or a before..after commit range
+
+    :param commit_id: github commit id or before..after range to use for email update
+    :return: dict with the variables used by the mail templates
+    """
+    if github is None:
+        init()
+    if not commit_id:
+        sys.stderr.write("No commit to examine, exiting")
+        sys.exit(1)
+
+    before, separator, after = commit_id.partition("..")
+    if separator and before not in ("", ZERO_COMMIT_ID):
+        commit_vars = get_commit_range(before, after.lstrip("."))
+    else:
+        commit_id = after.lstrip(".") if separator else commit_id
+        commit_vars = get_git_commit(commit_id)
+        commit_vars["commits"] = []
+        commit_vars["authors"] = []
+    if len(commit_vars["parents"]) > 1:
+        prior_commit_info = get_prior_commit(commit_id, commit_vars["parents"])
+        commit_vars["message"] = prior_commit_info["message"]
+        commit_vars["files"] = prior_commit_info["files"]
+        commit_vars["commit_url"] = prior_commit_info.get("commit_url", commit_vars["commit_url"])
+
+    change_size = 0
+    sites_changed = set()
+    files = commit_vars.pop("files")
+    # go through the files once, dropping each file's patch as soon as it can't be shown
+    while files:
+        f = files.pop()
+        if f['filename'].startswith(".") or f['filename'].startswith('templates') or '/' not in f['filename']:
+            sys.stdout.write(f"Skipping {f['filename']} since it's not related to a site config\n")
+            continue
+
+        instance_dir = f["filename"].split("/")[0]
+        sites_changed.add(get_cluster(instance_dir))
+        try:
+            size = int(f["changes"])
+        except (KeyError, TypeError, ValueError):
+            # don't care about errors here
+            size = 0
+        change_size += size
+        if change_size > PATCH_MAX_TOTAL_CHANGES:
+            # no patches are shown any more, only the sites are still needed
+            commit_vars["changes"].clear()
+            continue
+        commit_vars["changes"].append({"name": f["filename"],
+                                       "size": size,
+                                       "patch": f.get("patch", "") if size <= PATCH_MAX_FILE_CHANGES else ""})
+    commit_vars["changes"].reverse()
+    commit_vars['change_size'] = change_size
+    commit_vars['sites'] = list(sites_changed)
+    return commit_vars
+
+
+def get_template_env() -> jinja2.Environment:
+    """
+    Get the environment the mail templates are loaded from
+
+    The templates ship in the templates directory of this package, compiled templates
+    are kept in a bytecode cache between runs.
+
+    :return: jinja2 Environment
+    """
+    global template_env
+    if template_env is None:
+        try:
+            os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+        except OSError:
+            bytecode_cache = None
+        template_env = jinja2.Environment(loader=jinja2.PackageLoader(__package__),
+                                          bytecode_cache=bytecode_cache,
+                                          auto_reload=False)
+    return template_env
+
+
+def render_mail(commit_vars: dict) -> Tuple[str, str]:
+    """
+    Render the text and html mail bodies in memory
+
+    :param commit_vars: variables for the templates
+    :return: tuple of text body and html body
+    """
+    env = get_template_env()
+    return (env.get_template('email_template_text.j2').render(commit_vars),
+            env.get_template('email_template_html.j2').render(commit_vars))
+
+
+def write_mail(commit_vars: dict, directory: str = ".") -> None:
+    """
+    Render the text and html mail bodies to text_body and html_body, streaming the
+    output to the files
+
+    :param commit_vars: variables for the templates
+    :param directory: directory to write the files to
+    :return: None
+    """
+    env = get_template_env()
+    env.get_template('email_template_text.j2').stream(commit_vars).dump(os.path.join(directory, 'text_body'))
+    env.get_template('email_template_html.j2').stream(commit_vars).dump(os.path.join(directory, 'html_body'))
+
+
+def create_mail(commit_id: str = None) -> None:
+    """
+    Create a html and text mail body based on commit id or a before..after commit range
+
+    :param commit_id: github commit id or before..after range to use for email update
+    :return: None
+    """
+    write_mail(get_commit_vars(commit_id))
+
+
+if __name__ == "__main__":
+    create_mail(sys.argv[1])
@@ -0,0 +1,357 @@
+"""
+Python script to send out emails using mailgun, looks at the environment for the
+following parameters:
+
+MAILGUN_SUBJECT: SLATE GitOps Change Summary
+MAILGUN_BODY: body of text
+MAILGUN_API_KEY: mailgun api key
+MAILGUN_DOMAIN: slateci.io
+MAILGUN_FROM: GitOps Notification <noreply@slateci.io>
+MAILGUN_SEND_TO: comma separated list of recipients
+
+and optionally:
+
+MAILGUN_API_URL: base URL of the mailgun API, defaults to https://api.mailgun.net/v3
+MAILGUN_BATCH_SIZE: recipients per message, at most 1000 (the mailgun limit)
+MAILGUN_MAX_WORKERS: batches sent at the same time, defaults to 4
+MAILGUN_MAX_ATTEMPTS: attempts per batch on 429 or 5xx answers, defaults to 5
+MAILGUN_SPOOL_DIR: directory of undelivered messages, defaults to ~/.cache/slate-mail-spool
+MAILGUN_DEAD_LETTER_DIR: directory of messages given up on, defaults to dead in MAILGUN_SPOOL_DIR
+MAILGUN_SPOOL_MAX_ATTEMPTS: delivery runs before a message is given up on, defaults to 10
+MAILGUN_SPOOL_MAX_AGE: seconds after which an undelivered message is given up on, defaults to 7 days
+
+Recipients are split into batches sent with recipient-variables, so mailgun
+delivers a separate copy to every recipient and no one sees the other addresses.
+
+Every message is first written to the spool directory and then the whole spool is
+drained, so a message that can't be delivered is retried by the next run. Queued
+messages for the same sender and recipients are merged into one digest. Messages
+mailgun rejects with a status that isn't worth retrying, and messages still
+undelivered after MAILGUN_SPOOL_MAX_ATTEMPTS runs or MAILGUN_SPOOL_MAX_AGE seconds,
+are moved to the dead letter directory so they don't hold back later messages.
+
+Originally written by Suchandra Thapa
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple
+
+import requests
+
+from .slate_api import backoff_delays
+
+MAILGUN_API_URL = os.environ.get('MAILGUN_API_URL', "https://api.mailgun.net/v3")
+MAILGUN_BATCH_LIMIT = 1000
+MAILGUN_BATCH_SIZE = min(MAILGUN_BATCH_LIMIT, int(os.environ.get('MAILGUN_BATCH_SIZE', MAILGUN_BATCH_LIMIT)))
+MAILGUN_MAX_WORKERS = int(os.environ.get('MAILGUN_MAX_WORKERS', 4))
+MAILGUN_MAX_ATTEMPTS = int(os.environ.get('MAILGUN_MAX_ATTEMPTS', 5))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# longest wait in seconds between attempts, also caps the Retry-After mailgun asks for
+MAILGUN_MAX_DELAY = 30.0
+MAILGUN_SPOOL_DIR = os.environ.get('MAILGUN_SPOOL_DIR') or \
+    os.path.join(os.path.expanduser("~"), ".cache", "slate-mail-spool")
+MAILGUN_DEAD_LETTER_DIR = os.environ.get('MAILGUN_DEAD_LETTER_DIR') or os.path.join(MAILGUN_SPOOL_DIR, "dead")
+MAILGUN_SPOOL_MAX_ATTEMPTS = int(os.environ.get('MAILGUN_SPOOL_MAX_ATTEMPTS', 10))
+MAILGUN_SPOOL_MAX_AGE = float(os.environ.get('MAILGUN_SPOOL_MAX_AGE', 7 * 24 * 3600))
+HTML_BODY = re.compile(r"<body[^>]*>(.*)</body>", re.IGNORECASE | re.DOTALL)
+
+
+class BatchResult(NamedTuple):
+    """
+    Outcome of sending one batch of recipients
+    """
+    index: int
+    recipients: List[str]
+    ok: bool
+    status: int
+    attempts: int
+    message: str
+
+
+def verify_env() -> bool:
+    """
+    Verify environment to make sure variables above are present and valid
+    :return: True if environment okay, False otherwise
+    """
+    mailgun_vars = {'MAILGUN_SUBJECT',
+                    'MAILGUN_API_KEY',
+                    'MAILGUN_DOMAIN',
+                    'MAILGUN_FROM',
+                    'MAILGUN_SEND_TO'}
+    env_vars = set(os.environ.keys())
+    if not mailgun_vars <= env_vars:
+        difference = mailgun_vars - env_vars
+        sys.stderr.write(f"Not all mailgun variables set, missing: {difference}\n")
+        return False
+    return True
+
+
+def read_body(path: str) -> str:
+    """
+    Read a rendered mail body written by the ``mail-body`` command
+
+    :param path: path to the file
+    :return: contents of the file, empty if it doesn't exist
+    """
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def get_recipients() -> List[str]:
+    """
+    Get the recipients from MAILGUN_SEND_TO
+
+    :return: list of addresses
+    """
+    return [address.strip() for address in os.environ['MAILGUN_SEND_TO'].split(",") if address.strip()]
+
+
+def new_message(text_body: str, html_body: str) -> dict:
+    """
+    Create a message to the recipients in MAILGUN_SEND_TO
+
+    :param text_body: plain text body of the message
+    :param html_body: html body of the message
+    :return: dict with the message and its recipients
+    """
+    if len(text_body) == 0 and len(html_body) == 0:
+        text_body = "Could not retrieve changes for this update"
+    return {"from": os.environ['MAILGUN_FROM'],
+            "to": get_recipients(),
+            "subject": os.environ['MAILGUN_SUBJECT'],
+            "text": text_body,
+            "html": html_body,
+            "created": time.time(),
+            "attempts": 0,
+            "updates": 1}
+
+
+def send_batch(session: requests.Session, index: int, message: dict, recipients: List[str]) -> BatchResult:
+    """
+    Send a message to one batch of recipients, retrying on 429 and 5xx answers
+
+    :param session: session to send the request with
+    :param index: number of the batch, used in reports
+    :param message: message to send
+    :param recipients: addresses in the batch
+    :return: BatchResult
+    """
+    mailgun_url = f"{MAILGUN_API_URL}/{os.environ['MAILGUN_DOMAIN']}/messages"
+    data = {"from": message["from"],
+            "to": recipients,
+            "subject": message["subject"] if message.get("updates", 1) == 1 else
+            f"{message['subject']} ({message['updates']} updates)",
+            "text": message["text"],
+            "html": message["html"],
+            "recipient-variables": json.dumps({address: {} for address in recipients})}
+    delays = backoff_delays(base=1.0, cap=MAILGUN_MAX_DELAY)
+    status = 0
+    response_text = ""
+    for attempt in range(1, MAILGUN_MAX_ATTEMPTS + 1):
+        try:
+            r = session.post(mailgun_url, auth=("api", os.environ['MAILGUN_API_KEY']), data=data, timeout=(10, 60))
+        except requests.RequestException as e:
+            status, response_text = 0, str(e)
+        else:
+            status, response_text = r.status_code, r.text
+            if status == requests.codes.ok:
+                return BatchResult(index, recipients, True, status, attempt, response_text)
+            if status not in RETRY_STATUSES:
+                break
+        if attempt < MAILGUN_MAX_ATTEMPTS:
+            delay = next(delays)
+            if status and r.headers.get("Retry-After", "").isdigit():
+                delay = min(MAILGUN_MAX_DELAY, float(r.headers["Retry-After"]))
+            time.sleep(delay)
+    return BatchResult(index, recipients, False, status, attempt, response_text)
+
+
+def send_message(message: dict, session: requests.Session = None) -> Tuple[List[str], List[str]]:
+    """
+    Send out a message using mailgun, in batches of MAILGUN_BATCH_SIZE recipients
+    :param message: message to send
+    :param session: session to send the requests with, None to use a new one
+    :return: recipients the message may be delivered to by a later attempt, and recipients whose
+             batch mailgun rejected with a status that isn't worth retrying
+    """
+    recipients = message["to"]
+    batches = [recipients[i:i + MAILGUN_BATCH_SIZE] for i in range(0, len(recipients), MAILGUN_BATCH_SIZE)]
+    if not batches:
+        sys.stderr.write("No recipients for message\n")
+        return [], []
+    own_session = session is None
+    if own_session:
+        session = requests.Session()
+    try:
+        with ThreadPoolExecutor(max_workers=min(MAILGUN_MAX_WORKERS, len(batches))) as executor:
+            results = list(executor.map(lambda batch: send_batch(session, batch[0], message, batch[1]),
+                                        enumerate(batches, 1)))
+    finally:
+        if own_session:
+            session.close()
+    retry, rejected = [], []
+    for result in results:
+        if result.ok:
+            sys.stdout.write(f"Sent email batch {result.index}/{len(batches)} to {len(result.recipients)} "
+                             f"recipients through mailgun\n")
+        else:
+            sys.stderr.write(f"Can't send email batch {result.index}/{len(batches)} to {len(result.recipients)} "
+                             f"recipients after {result.attempts} attempts, got HTTP code {result.status}: "
+                             f"{result.message}\n")
+            if result.status == 0 or result.status in RETRY_STATUSES:
+                retry.extend(result.recipients)
+            else:
+                rejected.extend(result.recipients)
+    return retry, rejected
+
+
+def spool_message(message: dict, directory: str = None) -> str:
+    """
+    Write a message to the spool directory
+
+    The message is written to a temporary file that is renamed into place, so
+    the spool never contains a partial message.
+
+    :param message: message to queue
+    :param directory: directory to write the message to, None for MAILGUN_SPOOL_DIR
+    :return: path of the spooled message
+    """
+    directory = directory or MAILGUN_SPOOL_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.time_ns()}-{os.getpid()}.json")
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(message, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return path
+
+
+def read_spool() -> List[Tuple[str, dict]]:
+    """
+    Read the queued messages, oldest first
+
+    :return: list of spool file paths and messages
+    """
+    try:
+        names = sorted(name for name in os.listdir(MAILGUN_SPOOL_DIR) if name.endswith(".json"))
+    except FileNotFoundError:
+        return []
+    spooled = []
+    for name in names:
+        path = os.path.join(MAILGUN_SPOOL_DIR, name)
+        try:
+            with open(path, "r") as f:
+                spooled.append((path, json.load(f)))
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f"Skipping unreadable spooled message {path}: {e}\n")
+    return spooled
+
+
+def coalesce(messages: List[dict]) -> dict:
+    """
+    Merge messages to the same recipients into one digest message
+
+    :param messages: messages to merge, oldest first
+    :return: merged message
+    """
+    if len(messages) == 1:
+        return messages[0]
+    html_parts = []
+    for message in messages:
+        match = HTML_BODY.search(message["html"])
+        html_parts.append(match.group(1) if match else message["html"])
+    return {"from": messages[0]["from"],
+            "to": messages[0]["to"],
+            "subject": messages[-1]["subject"],
+            "text": f"\n\n{'-' * 72}\n\n".join(message["text"] for message in messages),
+            "html": "<!DOCTYPE html>\n<html lang=\"en\">\n<body>\n" + "\n<hr/>\n".join(html_parts) +
+                    "\n</body>\n</html>",
+            "created": messages[0]["created"],
+            "attempts": max(message.get("attempts", 0) for message in messages),
+            "updates": sum(message.get("updates", 1) for message in messages)}
+
+
+def drain_spool(session: requests.Session = None) -> bool:
+    """
+    Send every queued message, merging messages to the same recipients
+
+    Delivered messages are removed from the spool. Messages that couldn't be
+    delivered to every recipient are queued again for the remaining recipients,
+    unless mailgun rejected them or they ran out of attempts, then they are moved
+    to MAILGUN_DEAD_LETTER_DIR.
+
+    :param session: session to send the requests with, None to use a new one
+    :return: True if every queued message was delivered, False otherwise
+    """
+    groups: Dict[Tuple[str, Tuple[str, ...]], List[Tuple[str, dict]]] = {}
+    for path, message in read_spool():
+        groups.setdefault((message["from"], tuple(sorted(message["to"]))), []).append((path, message))
+    delivered = True
+    for entries in groups.values():
+        message = coalesce([message for _, message in entries])
+        retry, rejected = send_message(message, session)
+        if rejected:
+            delivered = False
+            sys.stderr.write(f"Moving message to {len(rejected)} recipients rejected by mailgun to "
+                             f"{MAILGUN_DEAD_LETTER_DIR}\n")
+            spool_message(dict(message, to=rejected), MAILGUN_DEAD_LETTER_DIR)
+        if retry:
+            delivered = False
+            message = dict(message, to=retry, attempts=message.get("attempts", 0) + 1)
+            if message["attempts"] >= MAILGUN_SPOOL_MAX_ATTEMPTS or \
+                    time.time() - message["created"] >= MAILGUN_SPOOL_MAX_AGE:
+                sys.stderr.write(f"Giving up on message to {len(retry)} recipients after {message['attempts']} "
+                                 f"delivery runs, moving it to {MAILGUN_DEAD_LETTER_DIR}\n")
+                spool_message(message, MAILGUN_DEAD_LETTER_DIR)
+            else:
+                sys.stderr.write(f"Keeping message to {len(retry)} recipients in {MAILGUN_SPOOL_DIR} "
+                                 f"after {message['attempts']} delivery runs\n")
+                spool_message(message)
+        for path, _ in entries:
+            os.unlink(path)
+    return delivered
+
+
+def deliver(text_body: str, html_body: str, session: requests.Session = None) -> bool:
+    """
+    Queue a message in the spool and then drain the spool
+
+    :param text_body: plain text body of the message
+    :param html_body: html body of the message
+    :param session: session to send the requests with, None to use a new one
+    :return: True if every queued message was delivered, False otherwise
+    """
+    spool_message(new_message(text_body, html_body))
+    return drain_spool(session)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="slate-gitops mailgun",
+                                     description="Send the change summary email using mailgun")
+    parser.add_argument("--drain-only", action="store_true",
+                        help="only send messages already queued in the spool, not text_body and html_body")
+    args = parser.parse_args()
+    if not verify_env():
+        sys.stderr.write("Missing mailgun variables, exiting\n")
+        sys.exit(1)
+    if args.drain_only:
+        delivered = drain_spool()
+    else:
+        delivered = deliver(read_body('text_body'), read_body('html_body'))
+    if not delivered:
+        sys.exit(1)
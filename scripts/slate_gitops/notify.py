@@ -0,0 +1,49 @@
+"""
+Python script used by Git Actions automation to render the change summary email for
+a push and send it using mailgun in a single process.
+
+The mail is rendered in memory and both the GitHub API and mailgun requests go
+through one pooled HTTPS session. The mail is queued in the mailgun spool
+before it is sent, see mailgun.py. With --render-only the text_body and html_body
+files are written to the current directory instead and nothing is sent, the
+mailgun variables are then not needed. See mailgun.py for the environment used
+to send the mail.
+"""
+
+import argparse
+import sys
+
+import requests
+
+from . import mail_body, mailgun
+
+
+def main() -> int:
+    """
+    Render and send the mail for the commit or commit range given on the command line
+
+    :return: exit code
+    """
+    parser = argparse.ArgumentParser(prog="slate-gitops notify",
+                                     description="Render and send the change summary email for a push")
+    parser.add_argument("commit", help="commit id or before..after range to report on")
+    parser.add_argument("--render-only", action="store_true",
+                        help="write text_body and html_body to the current directory instead of sending")
+    args = parser.parse_args()
+
+    if not args.render_only and not mailgun.verify_env():
+        sys.stderr.write("Missing mailgun variables, exiting\n")
+        return 1
+
+    with requests.Session() as session:
+        mail_body.init(session)
+        commit_vars = mail_body.get_commit_vars(args.commit)
+        if args.render_only:
+            mail_body.write_mail(commit_vars)
+            return 0
+        text_body, html_body = mail_body.render_mail(commit_vars)
+        return 0 if mailgun.deliver(text_body, html_body, session) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,812 @@
+"""
+Python script used by Git Actions automation to apply changes to SLATE instances
+described by a Git repository.
+
+Updates and additions are dispatched concurrently. The number of API calls in
+flight is bounded globally (``--max-workers`` / ``SLATE_MAX_WORKERS``) and per
+SLATE cluster (``--max-per-cluster`` / ``SLATE_MAX_PER_CLUSTER``).
+
+A normalized digest of each instance's values.yaml is recorded as ``valuesDigest``
+in its instance.yaml once the values have been applied. Updates whose values
+digest matches the recorded one (whitespace, comment or key order only changes,
+reverts) are skipped.
+
+New instances are added in two phases: every add is submitted first, then the ids
+SLATE didn't return right away are resolved together by a shared polling loop
+and written back to instance.yaml.
+
+With ``--reconcile`` every instance directory in the repository is compared with
+the instances SLATE lists (one listing per cluster) and the recorded values digest,
+and only the differences are applied. Instances whose recorded id SLATE doesn't
+list are reported as errors, and only added again with ``--readd-missing``.
+
+Latency, status, bytes sent and retries of every SLATE API call are summarized per
+operation and cluster in ``$GITHUB_STEP_SUMMARY`` and, with ``--metrics-file`` /
+``SLATE_METRICS_FILE``, written to a JSON file.
+
+Originally written by Mitchell Steinman
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import logging
+import threading
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack, closing
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import yaml
+from yaml.loader import SafeLoader
+
+from . import instance_config, slate_api
+from .instance_config import InstanceConfig
+
+# Set up by main() and shared by the functions below
+args: Optional[argparse.Namespace] = None
+apiMetrics: Optional[slate_api.ApiMetrics] = None
+slateClient: Optional[slate_api.SlateClient] = None
+instanceCache: Optional[slate_api.InstanceCache] = None
+pushOutputs: Optional["PushOutputs"] = None
+
+
+# Files describing a SLATE instance, found together in one instance directory
+INSTANCE_FILES = ("values.yaml", "instance.yaml")
+# Status letters from git diff --name-status that can be applied
+# A = Added, C = Copied, D = Deleted, M = Modified, R = Renamed, T = Type changed
+KNOWN_STATUSES = ("A", "C", "D", "M", "R", "T")
+# Number of polling rounds used to find instance ids missing from add responses
+RESOLVE_ATTEMPTS = 6
+
+
+class ChangeRecord(NamedTuple):
+    """
+    One entry of git diff --name-status output
+
+    old_path and score are only set for renames and copies.
+    """
+    status: str
+    path: str
+    old_path: Optional[str] = None
+    score: Optional[int] = None
+
+    def __str__(self) -> str:
+        status = self.status if self.score is None else f"{self.status}{self.score:03d}"
+        paths = self.path if self.old_path is None else f"{self.old_path}\t{self.path}"
+        return f"{status}\t{paths}"
+
+
+class InstancePlan(NamedTuple):
+    """
+    The single action to take for an instance directory touched by the push
+
+    action is one of add, update, noop or error. config and values hold the parsed
+    instance.yaml and the contents of values.yaml read while planning. new is True
+    when the instance files were added by the push, failing to add a new instance
+    fails the job.
+    """
+    container: str
+    action: str
+    entries: List[str]
+    new: bool = False
+    config: Optional[InstanceConfig] = None
+    values: str = ""
+
+
+class PushResult(NamedTuple):
+    """
+    Outcome of an InstancePlan
+
+    ok is False only for failures that must fail the job. instance_id is set for
+    added instances once their id is known.
+    """
+    ok: bool
+    added: bool = False
+    modified: bool = False
+    instance_id: str = ""
+
+
+def report_metrics() -> None:
+    """
+    Write the SLATE API measurements to the job summary and the metrics file, run at exit
+    """
+    if 'GITHUB_STEP_SUMMARY' in os.environ:
+        with open(os.environ['GITHUB_STEP_SUMMARY'], 'a') as filehandler:
+            print(apiMetrics.summary_markdown(), file=filehandler)
+    if args.metrics_file:
+        apiMetrics.write_json(args.metrics_file)
+        logging.info(f"Wrote SLATE API metrics to {args.metrics_file}")
+
+
+class PushOutputs:
+    """
+    Buffers instance.yaml writebacks and job outputs until the end of the run
+
+    flush() writes every changed instance.yaml atomically and all outputs to
+    GITHUB_OUTPUT at once: add and modify (true/false), added_count and
+    modified_count, and added_instances and modified_instances as JSON lists of
+    instance directories.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.writes: Dict[str, Dict[str, str]] = {}
+        self.added: Dict[str, str] = {}
+        self.modified: Dict[str, str] = {}
+
+    def record_add(self, containerName: str, instanceID: str, digest: str) -> None:
+        """
+        Remember a new instance, its id and the digest of the values it was created with
+
+        :param containerName: path to the instance directory
+        :param instanceID: SLATE instance id
+        :param digest: values.yaml digest
+        """
+        with self._lock:
+            self.added[containerName] = instanceID
+            self.writes.setdefault(containerName, {}).update({"instance": instanceID, "valuesDigest": digest})
+
+    def record_update(self, containerName: str, instanceID: str, digest: str) -> None:
+        """
+        Remember an updated instance and the digest of the values applied
+
+        :param containerName: path to the instance directory
+        :param instanceID: SLATE instance id
+        :param digest: values.yaml digest
+        """
+        with self._lock:
+            self.modified[containerName] = instanceID
+            self.writes.setdefault(containerName, {})["valuesDigest"] = digest
+
+    def flush(self) -> None:
+        """
+        Write the buffered instance.yaml changes and job outputs
+        """
+        with self._lock:
+            writes, self.writes = self.writes, {}
+            added, modified = sorted(self.added), sorted(self.modified)
+        for containerName, fields in sorted(writes.items()):
+            try:
+                instance_config.write_instance_fields(containerName, fields)
+                logging.info(f"Wrote {containerName}/instance.yaml")
+            except OSError:
+                logging.exception(f"Failed to update instance file: {containerName}/instance.yaml")
+        with open(os.environ['GITHUB_OUTPUT'], 'a') as filehandler:
+            print(f"add={'true' if added else 'false'}", file=filehandler)
+            print(f"modify={'true' if modified else 'false'}", file=filehandler)
+            print(f"added_count={len(added)}", file=filehandler)
+            print(f"modified_count={len(modified)}", file=filehandler)
+            print(f"added_instances={json.dumps(added)}", file=filehandler)
+            print(f"modified_instances={json.dumps(modified)}", file=filehandler)
+
+
+def read_instance_config(containerName: str) -> Optional[InstanceConfig]:
+    """
+    Parse the instance.yaml file found in an instance directory
+
+    :param containerName: path to the instance directory
+    :return: InstanceConfig or None if the file can't be read
+    """
+    try:
+        return instance_config.load_instance_config(containerName)
+    except OSError:
+        logging.exception(f"Failed to open instance file for reading: {containerName}/instance.yaml")
+        return None
+
+
+def values_digest(valuesString: str) -> str:
+    """
+    Compute a digest of values.yaml that ignores formatting
+
+    :param valuesString: contents of values.yaml
+    :return: hex sha256 digest
+    """
+    try:
+        normalized = json.dumps(yaml.load(valuesString, Loader=SafeLoader), sort_keys=True,
+                                separators=(",", ":"), default=str)
+    except yaml.YAMLError:
+        logging.warning("values.yaml is not valid YAML, digesting the raw text")
+        normalized = "\n".join(line.rstrip() for line in valuesString.strip().splitlines())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def list_instance_ids(plans: List[InstancePlan], executor: ThreadPoolExecutor) -> Dict[str, Set[str]]:
+    """
+    Get the ids of the instances of the added applications running before anything is added
+
+    This costs one listing per cluster instances are added to, unless the cluster was
+    already listed during the run (by --reconcile). It can't be put off until an add
+    comes back without an id: by then an instance of the same application and group
+    that was already running can't be told apart from the new one.
+
+    :param plans: planned adds
+    :param executor: pool used to list clusters concurrently
+    :return: the listed ids of instances of the same application and group, by cluster
+    """
+    clusters = sorted({plan.config.cluster for plan in plans})
+    listed = dict(zip(clusters, executor.map(list_cluster, clusters)))
+    knownIDs: Dict[str, Set[str]] = {}
+    for plan in plans:
+        instanceConfig = plan.config
+        if listed[instanceConfig.cluster]:
+            knownIDs.setdefault(instanceConfig.cluster, set()).update(
+                instanceCache.instance_ids(instanceConfig.cluster, instanceConfig.app, instanceConfig.group) or ())
+    for cluster in clusters:
+        if not listed[cluster]:
+            logging.warning(f"Can't list the instances already running on {cluster}, "
+                            f"ids of instances added to it may be confused with them")
+    return knownIDs
+
+
+def resolve_instance_ids(plans: List[InstancePlan], executor: ThreadPoolExecutor,
+                         knownIDs: Dict[str, Set[str]]) -> Dict[str, str]:
+    """
+    Find the ids SLATE didn't return for newly added instances
+
+    All pending instances are polled together: each round lists every cluster with
+    pending instances once and resolves all of them from that listing. Rounds are
+    spaced out with capped exponential backoff. Ids in knownIDs, those of instances
+    that ran before the adds or already belong to another instance of this run, are
+    never taken, so an existing instance of the same application and group isn't
+    mistaken for the new one.
+
+    :param plans: planned adds whose instance id is still unknown
+    :param executor: pool used to list clusters concurrently
+    :param knownIDs: ids that aren't of a pending instance, by cluster, resolved ids are added
+    :return: instance id for each resolved instance directory
+    """
+    unresolved = {plan.container: plan for plan in plans}
+    resolved: Dict[str, str] = {}
+    delays = slate_api.backoff_delays(base=2.0, cap=slateClient.max_delay)
+
+    def poll_cluster(cluster: str, pending: List[InstancePlan], since: float) -> Dict[str, str]:
+        found = {}
+        # Only this thread polls the cluster during a round, so it can update the cluster's known ids
+        excluded = knownIDs.setdefault(cluster, set())
+        for plan in pending:
+            try:
+                instance_id = instanceCache.lookup(cluster, plan.config.app, plan.config.group, since=since,
+                                                   exclude=excluded)
+            except slate_api.SlateAPIError as e:
+                logging.error(f"Failed to list instances on {cluster}: {e}")
+                break
+            if instance_id is not None:
+                found[plan.container] = instance_id
+                excluded.add(instance_id)
+        return found
+
+    with ExitStack() as stack:
+        for cluster in sorted({plan.config.cluster for plan in plans}):
+            stack.enter_context(instanceCache.pending_add(cluster))
+        for attempt in range(RESOLVE_ATTEMPTS):
+            if not unresolved:
+                break
+            if attempt > 0:
+                delay = next(delays)
+                logging.info(f"Sleeping for {delay:.1f}s before querying SLATE for {len(unresolved)} instance id(s)")
+                time.sleep(delay)
+            since = time.monotonic()
+            pendingByCluster: Dict[str, List[InstancePlan]] = {}
+            for plan in unresolved.values():
+                pendingByCluster.setdefault(plan.config.cluster, []).append(plan)
+            futures = [executor.submit(poll_cluster, cluster, pending, since)
+                       for cluster, pending in sorted(pendingByCluster.items())]
+            for found in [future.result() for future in futures]:
+                for container, instance_id in found.items():
+                    logging.info(f"Resolved instance id {instance_id} for {container}")
+                    resolved[container] = instance_id
+                    del unresolved[container]
+    for container in unresolved:
+        logging.error(f"Can't get instance id for {container}")
+    return resolved
+
+
+def add_instance(plan: InstancePlan) -> Optional[str]:
+    """
+    Add an instance to slate api server
+
+    :param plan: planned add with the parsed instance.yaml and values.yaml
+    :return: the instance id, an empty string if SLATE didn't return one or None on error
+    """
+    instanceConfig = plan.config
+    try:
+        response = slateClient.add_instance(instanceConfig.app, instanceConfig.group, instanceConfig.cluster,
+                                            plan.values)
+    except slate_api.SlateAPIError as e:
+        logging.error(f"Encountered error while adding instance: {e}")
+        return None
+    if response.status_code != 200:
+        logging.error("Encountered error while adding instance")
+        logging.error(f"Got a {response.status_code} from the server")
+        return None
+    instance_id = response.json().get("metadata", {}).get("id", "")
+    if instance_id == "":
+        logging.warning(f"Didn't get instance id for {plan.container} from SLATE response, resolving it later")
+    else:
+        logging.debug(f"Parsed instance id {instance_id}")
+    return instance_id
+
+
+def update_instance(plan: InstancePlan) -> PushResult:
+    """
+    Push the values.yaml of an existing instance to slate api server
+
+    :param plan: planned update with the parsed instance.yaml and values.yaml
+    :return: PushResult
+    """
+    containerName = plan.container
+    instanceConfig = plan.config
+    instanceID = instanceConfig.instance
+    valuesString = plan.values
+    digest = values_digest(valuesString)
+    if instanceConfig.valuesDigest == digest:
+        logging.info(f"values.yaml of instance {instanceID} matches the last applied values, skipping")
+        return PushResult(ok=True)
+    try:
+        response = slateClient.update_instance(instanceID, valuesString, instanceConfig.cluster)
+    except slate_api.SlateAPIError as e:
+        logging.error(f"Encountered error while updating instance {instanceID}: {e}")
+        return PushResult(ok=False)
+    if response.status_code == 200:
+        logging.info(f"Successfully updated instance {instanceID}")
+        pushOutputs.record_update(containerName, instanceID, digest)
+        return PushResult(ok=True, modified=True)
+    logging.error(f"Encountered error while updating instance {instanceID}")
+    logging.error(f"Got a {response.status_code} from the server")
+    return PushResult(ok=False)
+
+
+def iter_tokens(stream: BinaryIO, separator: bytes, chunk_size: int = 65536) -> Iterator[str]:
+    """
+    Lazily split a byte stream on a separator
+
+    :param stream: stream to read
+    :param separator: token separator, newline or NUL
+    :param chunk_size: number of bytes to read at a time
+    :return: iterator of decoded tokens
+    """
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        *tokens, pending = (pending + chunk).split(separator)
+        for token in tokens:
+            yield token.decode("utf-8", "surrogateescape")
+    if pending:
+        yield pending.decode("utf-8", "surrogateescape")
+
+
+def unquote_path(path: str) -> str:
+    """
+    Undo the C-style quoting git applies to unusual paths when not using -z
+
+    :param path: path as printed by git
+    :return: the actual path
+    """
+    if len(path) < 2 or not (path.startswith('"') and path.endswith('"')):
+        return path
+    escaped = path[1:-1].encode("utf-8", "surrogateescape").decode("unicode_escape")
+    return escaped.encode("latin-1").decode("utf-8", "surrogateescape")
+
+
+def make_change_record(status: str, paths: List[str]) -> ChangeRecord:
+    """
+    Build a ChangeRecord from a status field and its paths
+
+    :param status: status field, e.g. M or R100
+    :param paths: one path, or the source and destination for renames and copies
+    :return: ChangeRecord, with status ? if the entry is malformed
+    """
+    letter, score = status[:1], status[1:]
+    expected = 2 if letter in ("R", "C") else 1
+    if len(paths) != expected or not all(paths) or (score and not score.isdigit()):
+        return ChangeRecord("?", "\t".join([status] + paths))
+    if expected == 2:
+        return ChangeRecord(letter, paths[1], paths[0], int(score) if score else None)
+    return ChangeRecord(letter, paths[0])
+
+
+def parse_name_status(stream: BinaryIO, nul_separated: bool = False) -> Iterator[ChangeRecord]:
+    """
+    Lazily parse git diff --name-status output
+
+    :param stream: binary stream with the diff output
+    :param nul_separated: True if the output was produced with -z
+    :return: iterator of ChangeRecord
+    """
+    if not nul_separated:
+        for line in iter_tokens(stream, b"\n"):
+            if line.strip() == "":
+                continue
+            status, *paths = line.rstrip("\r").split("\t")
+            yield make_change_record(status.strip(), [unquote_path(path) for path in paths])
+        return
+    tokens = iter_tokens(stream, b"\0")
+    for status in tokens:
+        status = status.strip()
+        if status == "":
+            continue
+        count = 2 if status[:1] in ("R", "C") else 1
+        yield make_change_record(status, [next(tokens, "") for _ in range(count)])
+
+
+def read_changes() -> Iterator[ChangeRecord]:
+    """
+    Stream the changed files from the file, stdin or git diff named on the command line
+
+    :return: iterator of ChangeRecord
+    """
+    if args.git_diff:
+        command = ["git", "diff", "--name-status", "-z", "--find-renames", *args.git_diff]
+        logging.info(f"Reading changed files from: {' '.join(command)}")
+        process = subprocess.Popen(command, stdout=subprocess.PIPE)
+        finished = False
+        try:
+            with process.stdout:
+                yield from parse_name_status(process.stdout, nul_separated=True)
+            finished = True
+        finally:
+            # Always reap git, stopping it first if the caller stopped reading early
+            if not finished:
+                process.terminate()
+            process.wait()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+    elif args.changed_files == "-":
+        yield from parse_name_status(sys.stdin.buffer, args.nul_separated)
+    else:
+        with open(args.changed_files, "rb") as stream:
+            yield from parse_name_status(stream, args.nul_separated)
+
+
+def run_plan(plan: InstancePlan) -> PushResult:
+    """
+    Carry out the action planned for an instance, called from the worker pool
+
+    :param plan: the planned action
+    :return: PushResult
+    """
+    logging.info(f"{plan.action} {plan.container}: {', '.join(plan.entries)}")
+    if plan.action == "update":
+        return update_instance(plan)
+    instance_id = add_instance(plan)
+    if instance_id is None:
+        logging.error(f"Got error while adding new instance {plan.container}")
+        return PushResult(ok=not plan.new)
+    if instance_id:
+        pushOutputs.record_add(plan.container, instance_id, values_digest(plan.values))
+    return PushResult(ok=True, added=True, instance_id=instance_id)
+
+
+def apply_plans(tasks: List[InstancePlan], executor: ThreadPoolExecutor) -> List[PushResult]:
+    """
+    Carry out the planned adds and updates, at most max_per_cluster at a time on each cluster
+
+    Every cluster has its own queue of tasks and a task is only submitted to the pool
+    once its cluster has a free slot, so tasks waiting for a busy cluster never hold a
+    worker that tasks for other clusters could use.
+
+    :param tasks: the planned adds and updates
+    :param executor: pool the tasks run in
+    :return: PushResult of each task, in the order of tasks
+    """
+    perCluster = max(args.max_per_cluster, 1)
+    queues: Dict[str, deque] = {}
+    for index, task in enumerate(tasks):
+        queues.setdefault(task.config.cluster, deque()).append(index)
+    results: List[Optional[PushResult]] = [None] * len(tasks)
+    running: Dict[Future, Tuple[int, str]] = {}
+
+    def submit_next(cluster: str) -> None:
+        index = queues[cluster].popleft()
+        running[executor.submit(run_plan, tasks[index])] = (index, cluster)
+
+    for cluster, queue in queues.items():
+        for _ in range(min(perCluster, len(queue))):
+            submit_next(cluster)
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            index, cluster = running.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception:
+                logging.exception(f"Unexpected error while processing {tasks[index].container}")
+                results[index] = PushResult(ok=False)
+            if queues[cluster]:
+                submit_next(cluster)
+    return results
+
+
+def plan_instance(containerName: str, statuses: Dict[str, str], entries: List[str]) -> InstancePlan:
+    """
+    Resolve the changes to the files of one instance directory into a single action
+
+    :param containerName: path to the instance directory
+    :param statuses: git status of each changed file in the directory, keyed by file name
+    :param entries: the changed file entries, for logging
+    :return: InstancePlan
+    """
+    if "D" in statuses.values():
+        logging.warning(f"Deletion is not implemented. Your instance {containerName} is still running in SLATE "
+                        f"despite file deletion.")
+        return InstancePlan(containerName, "noop", entries)
+    added = "A" in statuses.values()
+    instanceConfig = read_instance_config(containerName)
+    if instanceConfig is None:
+        # A broken added instance fails the job, a broken existing one is only reported
+        return InstancePlan(containerName, "error" if added else "noop", entries)
+    try:
+        valuesString = open(containerName + "/" + "values.yaml", "r").read()
+    except IOError:
+        logging.exception(f"Failed to open values file for reading: {containerName}/values.yaml")
+        return InstancePlan(containerName, "error" if added else "noop", entries)
+
+    if instanceConfig.instance:
+        if added:
+            logging.warning(f"Detected newly added but existing instance {containerName}, updating it instead")
+        if "values.yaml" not in statuses:
+            logging.warning(f"Not implemented: Version update for {containerName}, only values.yaml is applied")
+        return InstancePlan(containerName, "update", entries, added, instanceConfig, valuesString)
+
+    missing = [key for key in ("cluster", "group", "app") if not getattr(instanceConfig, key)]
+    if missing:
+        logging.error(f"Can't add instance {containerName}, {containerName}/instance.yaml is missing {missing}")
+        return InstancePlan(containerName, "error", entries)
+    if not added:
+        logging.error(f"Failed to find instance ID for {containerName} in {containerName}/instance.yaml")
+        logging.warning("Trying to add instance instead...")
+    return InstancePlan(containerName, "add", entries, added, instanceConfig, valuesString)
+
+
+def plan_changes() -> Tuple[List[InstancePlan], bool]:
+    """
+    Plan one action per instance directory touched by the changed files
+
+    :return: the plans and whether an invalid file status was found
+    """
+    # Group the changed files by instance directory, in the order the directories first appear
+    changedInstances: Dict[str, Dict[str, str]] = {}
+    changedEntries: Dict[str, List[str]] = {}
+    invalidStatus = False
+    try:
+        with closing(read_changes()) as changes:
+            for Change in changes:
+                Entry = str(Change)
+                if Change.status not in KNOWN_STATUSES:
+                    # Changes listed before the invalid entry are still applied, as they were when
+                    # entries were processed one at a time
+                    logging.error(f"Error: Invalid file status passed by actions: {Entry}")
+                    invalidStatus = True
+                    break
+                # Renamed and copied files are new files in their destination, the instance
+                # itself moves with its instance.yaml
+                FileStatus = {"C": "A", "R": "A", "T": "M"}.get(Change.status, Change.status)
+                if Change.old_path is not None:
+                    logging.info(f"{Change.path} was {'renamed' if Change.status == 'R' else 'copied'} "
+                                 f"from {Change.old_path}")
+                # The "container" is any arbitrary path before the slate details
+                # 'values.yaml' and 'instance.yaml'
+                containerName, _, baseName = Change.path.rpartition("/")
+                # Skip irrelevant files
+                if baseName not in INSTANCE_FILES or containerName == "" or \
+                        any(part.startswith(".") for part in containerName.split("/")):
+                    logging.warning(f"Skipping file {Entry}")
+                    continue
+                changedInstances.setdefault(containerName, {})[baseName] = FileStatus
+                changedEntries.setdefault(containerName, []).append(Entry)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.error(f"Failed to read changed files: {e}")
+        sys.exit(1)
+
+    return [plan_instance(container, statuses, changedEntries[container])
+            for container, statuses in changedInstances.items()], invalidStatus
+
+
+def find_instance_dirs(root: str = ".") -> Iterator[str]:
+    """
+    Walk the repository for instance directories, skipping dot-directories
+
+    :param root: repository checkout
+    :return: iterator of instance directory paths relative to root, in sorted order
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        if dirpath != root and all(name in filenames for name in INSTANCE_FILES):
+            yield os.path.relpath(dirpath, root)
+
+
+def list_cluster(cluster: str) -> bool:
+    """
+    Fetch the instance listing of a cluster into the cache
+
+    :param cluster: slate cluster to list
+    :return: False if the cluster's instances can't be listed
+    """
+    try:
+        return instanceCache.fetch(cluster)
+    except slate_api.SlateAPIError as e:
+        logging.error(f"Failed to list instances on {cluster}: {e}")
+        return False
+
+
+def plan_reconcile() -> List[InstancePlan]:
+    """
+    Plan the actions that bring every instance directory in the repository in line with SLATE
+
+    Each cluster's instances are listed once. Instances without an id are added,
+    instances whose values digest differs from the last applied one are updated and
+    everything else is left alone. Instances SLATE doesn't list under their recorded
+    id are errors, unless --readd-missing was given, in which case they are added again.
+
+    :return: the plans
+    """
+    plans: List[InstancePlan] = []
+    known: List[InstancePlan] = []
+    for containerName in find_instance_dirs():
+        instanceConfig = read_instance_config(containerName)
+        if instanceConfig is None:
+            plans.append(InstancePlan(containerName, "error", ["reconcile"]))
+            continue
+        missing = [key for key in ("cluster", "group", "app") if not getattr(instanceConfig, key)]
+        if missing:
+            logging.error(f"Can't reconcile {containerName}, {containerName}/instance.yaml is missing {missing}")
+            plans.append(InstancePlan(containerName, "error", ["reconcile"]))
+            continue
+        try:
+            valuesString = open(containerName + "/" + "values.yaml", "r").read()
+        except IOError:
+            logging.exception(f"Failed to open values file for reading: {containerName}/values.yaml")
+            plans.append(InstancePlan(containerName, "error", ["reconcile"]))
+            continue
+        if not instanceConfig.instance:
+            plans.append(InstancePlan(containerName, "add", ["reconcile: no instance id"], True, instanceConfig,
+                                      valuesString))
+        else:
+            known.append(InstancePlan(containerName, "update", ["reconcile"], False, instanceConfig, valuesString))
+
+    clusters = sorted({plan.config.cluster for plan in known})
+    logging.info(f"Listing instances on {len(clusters)} cluster(s) for {len(plans) + len(known)} instance(s)")
+    with ThreadPoolExecutor(max_workers=max(args.max_workers, 1), thread_name_prefix="list") as executor:
+        listed = dict(zip(clusters, executor.map(list_cluster, clusters)))
+
+    for plan in known:
+        instanceConfig = plan.config
+        if not listed[instanceConfig.cluster]:
+            plans.append(plan._replace(action="error"))
+        elif not instanceCache.is_listed(instanceConfig.cluster, instanceConfig.instance):
+            if args.readd_missing:
+                logging.warning(f"Instance {instanceConfig.instance} of {plan.container} is not running on "
+                                f"{instanceConfig.cluster}, adding it again")
+                plans.append(plan._replace(action="add", entries=["reconcile: not running in SLATE"], new=True))
+            else:
+                logging.error(f"Instance {instanceConfig.instance} of {plan.container} is not running on "
+                              f"{instanceConfig.cluster}, pass --readd-missing to add it again")
+                plans.append(plan._replace(action="error", entries=["reconcile: not running in SLATE"]))
+        elif instanceConfig.valuesDigest == values_digest(plan.values):
+            logging.debug(f"{plan.container} is up to date")
+            plans.append(plan._replace(action="noop"))
+        else:
+            plans.append(plan._replace(entries=["reconcile: values differ from the last applied values"]))
+    counts = Counter(plan.action for plan in plans)
+    logging.info(f"Reconcile plan: {counts['add']} add(s), {counts['update']} update(s), "
+                 f"{counts['noop']} up to date, {counts['error']} error(s)")
+    return plans
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """
+    Parse the command line
+
+    :param argv: the arguments, None to use sys.argv
+    :return: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(prog="slate-gitops push-updates",
+                                     description="Apply changes to SLATE instances described by a Git repository.")
+    parser.add_argument("changed_files", nargs="?",
+                        help="path to the output of 'git diff --name-status', '-' for stdin")
+    parser.add_argument("slate_token", help="SLATE API token")
+    parser.add_argument("slate_api_endpoint", help="SLATE API endpoint")
+    parser.add_argument("--max-workers", type=int, default=int(os.environ.get("SLATE_MAX_WORKERS", 8)),
+                        help="maximum number of SLATE API operations running at once")
+    parser.add_argument("--max-per-cluster", type=int, default=int(os.environ.get("SLATE_MAX_PER_CLUSTER", 2)),
+                        help="maximum number of SLATE API operations running at once against a single cluster")
+    parser.add_argument("-z", dest="nul_separated", action="store_true",
+                        help="the changed files were listed with 'git diff --name-status -z'")
+    parser.add_argument("--git-diff", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="run 'git diff --name-status -z BEFORE AFTER' instead of reading CHANGED_FILES")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="bring every instance directory in the repository in line with SLATE, "
+                             "not just changed ones")
+    parser.add_argument("--readd-missing", action="store_true",
+                        help="with --reconcile, add instances SLATE doesn't list under their recorded id again "
+                             "instead of reporting them")
+    parser.add_argument("--metrics-file", default=os.environ.get("SLATE_METRICS_FILE"),
+                        help="write per-call SLATE API measurements to this JSON file")
+    parsed = parser.parse_args(argv)
+    if [parsed.changed_files is not None, parsed.git_diff is not None, parsed.reconcile].count(True) != 1:
+        parser.error("pass exactly one of CHANGED_FILES, --git-diff or --reconcile")
+    if parsed.readd_missing and not parsed.reconcile:
+        parser.error("--readd-missing only applies to --reconcile")
+    return parsed
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Plan the changes named on the command line and apply them to SLATE
+
+    :param argv: the arguments, None to use sys.argv
+    :return: exit code
+    """
+    global args, apiMetrics, slateClient, instanceCache, pushOutputs
+    args = parse_args(argv)
+
+    if 'DEBUG' in os.environ and os.environ['DEBUG'] == 'TRUE':
+        logging.basicConfig(level=logging.DEBUG, format="%(levelname)s:%(threadName)s:%(message)s")
+    else:
+        logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(threadName)s:%(message)s")
+
+    apiMetrics = slate_api.ApiMetrics()
+    slateClient = slate_api.SlateClient(args.slate_api_endpoint, args.slate_token, pool_size=max(args.max_workers, 1),
+                                        metrics=apiMetrics)
+    instanceCache = slate_api.InstanceCache(slateClient)
+    pushOutputs = PushOutputs()
+    atexit.register(report_metrics)
+
+    if args.reconcile:
+        plans = plan_reconcile()
+        invalidStatus = False
+    else:
+        plans, invalidStatus = plan_changes()
+    tasks = [plan for plan in plans if plan.action in ("add", "update")]
+    planErrors = [plan for plan in plans if plan.action == "error"]
+
+    logging.info(f"Applying {len(tasks)} change(s) to {len(plans)} planned instance(s) with up to "
+                 f"{args.max_workers} worker(s), {args.max_per_cluster} per cluster")
+    try:
+        with ThreadPoolExecutor(max_workers=max(args.max_workers, 1), thread_name_prefix="push") as executor:
+            # Ids running before the adds, so they can't be mistaken for the ids of new instances
+            knownIDs = list_instance_ids([task for task in tasks if task.action == "add"], executor)
+            # Results are kept in diff order so the outputs don't depend on scheduling
+            results = apply_plans(tasks, executor)
+
+            # Resolve the ids SLATE didn't return in one shared polling loop, once every add has been submitted
+            pendingAdds = [task for task, result in zip(tasks, results) if result.added and not result.instance_id]
+            if pendingAdds:
+                for task, result in zip(tasks, results):
+                    if result.instance_id:
+                        knownIDs.setdefault(task.config.cluster, set()).add(result.instance_id)
+                resolvedIDs = resolve_instance_ids(pendingAdds, executor, knownIDs)
+                for i, (task, result) in enumerate(zip(tasks, results)):
+                    if result.added and not result.instance_id:
+                        instanceID = resolvedIDs.get(task.container, "")
+                        if instanceID:
+                            pushOutputs.record_add(task.container, instanceID, values_digest(task.values))
+                            results[i] = result._replace(instance_id=instanceID)
+                        else:
+                            results[i] = PushResult(ok=not task.new)
+    finally:
+        # Writeback instance IDs and digests and set the outputs for whatever was applied,
+        # even if the run stopped partway through
+        pushOutputs.flush()
+        slateClient.close()
+
+    failed = planErrors + [task for task, result in zip(tasks, results) if not result.ok]
+
+    for plan in failed:
+        logging.error(f"Failed to apply {', '.join(plan.entries)}")
+    if failed or invalidStatus:
+        logging.error("Exiting with error")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,441 @@
+"""
+This is a script to validate the schemas for the GitHub action and workflow YAML files and uses
+the YAML 1.2 compliant ``ruamel.yaml`` package (necessary to prevent ``on:`` from being converted to
+``True:``, etc.).
+
+The schemas are downloaded from schemastore.org and kept in a disk cache that is revalidated with
+ETags. With ``--offline`` no network requests are made and the schemas are read from the cache or,
+failing that, from the snapshot directory. ``--update-snapshot`` writes the current schemas to the
+snapshot directory so they can be bundled with the package. Each schema is checked and compiled into a
+validator once and reused for every file.
+
+Files are validated in parallel in a process pool and every schema violation in every file is
+collected. The run ends with one report sorted by file and JSON path, ``--annotations`` also writes the
+violations as GitHub workflow commands so they can be shown inline on the changed files.
+
+Results are kept in a cache keyed by the hashes of the file contents and of the schema, so only new or
+changed files are validated again. ``--changed-only`` restricts the run to the paths listed in a file,
+e.g. the output of ``git diff --name-only``.
+
+This script uses the following system environmental variables as inputs:
+
+* ``GITHUB_YAML_PATH``: specified by the GitHub workflow.
+* ``SCHEMA_CACHE_DIR``: optional directory for cached schemas, defaults to ``~/.cache/slate-schemas``.
+* ``SCHEMA_SNAPSHOT_DIR``: optional directory of bundled schemas, defaults to ``schemas`` in this package.
+* ``SCHEMA_RESULTS_CACHE``: optional results cache file, defaults to ``results.json`` in ``SCHEMA_CACHE_DIR``.
+"""
+
+import argparse
+import glob
+import hashlib
+import logging
+import json
+import os
+import sys
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    import jsonschema
+    from ruamel.yaml import YAML
+
+SCHEMA_URLS = {
+    "github-action": "https://json.schemastore.org/github-action.json",
+    "github-workflow": "https://json.schemastore.org/github-workflow.json",
+}
+SCHEMA_CACHE_DIR = os.environ.get('SCHEMA_CACHE_DIR') or \
+    os.path.join(os.path.expanduser("~"), ".cache", "slate-schemas")
+SCHEMA_SNAPSHOT_DIR = os.environ.get('SCHEMA_SNAPSHOT_DIR') or \
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+SCHEMA_RESULTS_CACHE = os.environ.get('SCHEMA_RESULTS_CACHE') or os.path.join(SCHEMA_CACHE_DIR, "results.json")
+
+# Set up logging:
+if 'DEBUG' in os.environ and os.environ['DEBUG'] == 'TRUE':
+    logging.getLogger().setLevel(logging.DEBUG)
+else:
+    logging.getLogger().setLevel(logging.INFO)
+
+# Loaders reused for every file, by type:
+loaders: Dict[str, "YAML"] = {}
+
+# Validators compiled once per process, by schema name:
+validators: Dict[str, "jsonschema.protocols.Validator"] = {}
+
+
+class SchemaViolation(NamedTuple):
+    """
+    A schema violation found in a file
+    """
+    file: str
+    path: str
+    message: str
+    line: Optional[int] = None
+
+
+def find_files(path: str) -> list:
+    """
+    Find the list of files given a path pattern.
+    :param path: the path to search
+    :return: a list of file paths
+    """
+
+    return glob.glob(pathname=path)
+
+
+def read_json(path: str):
+    """
+    Read a JSON file.
+    :param path: the file to read
+    :return: the decoded JSON or None if the file is missing or unreadable
+    """
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path: str, data) -> None:
+    """
+    Write a JSON file atomically.
+    :param path: the file to write
+    :param data: the data to write
+    :return: None
+    """
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def get_jsonschema(name: str, offline: bool = False) -> dict:
+    """
+    Get a JSON schema from the disk cache, revalidating it with its ETag, from
+    schemastore.org or from the snapshot directory.
+    :param name: the schema name, a key of SCHEMA_URLS
+    :param offline: True to never contact schemastore.org
+    :return: the schema as a json object
+    """
+
+    cache_path = os.path.join(SCHEMA_CACHE_DIR, f"{name}.json")
+    cached = read_json(cache_path)
+    if not offline:
+        import requests
+
+        headers = {"If-None-Match": cached["etag"]} if cached and cached.get("etag") else {}
+        try:
+            response = requests.get(SCHEMA_URLS[name], headers=headers, timeout=(10, 30))
+            if response.status_code == requests.codes.not_modified and cached:
+                logging.info(f"The cached GitHub {name} JSON schema is current.")
+                return cached["schema"]
+            response.raise_for_status()
+            schema = response.json()
+            try:
+                write_json(cache_path, {"etag": response.headers.get("ETag", ""), "schema": schema})
+            except OSError as e:
+                logging.warning(f"Can't cache the GitHub {name} JSON schema: {e}")
+            logging.info(f"Found the GitHub {name} JSON schema.")
+            return schema
+        except (requests.RequestException, ValueError) as e:
+            logging.warning(f"Can't download the GitHub {name} JSON schema, using a local copy: {e}")
+    if cached:
+        logging.info(f"Using the cached GitHub {name} JSON schema.")
+        return cached["schema"]
+    snapshot = read_json(os.path.join(SCHEMA_SNAPSHOT_DIR, f"{name}.json"))
+    if snapshot is None:
+        logging.error(f"No cached or bundled copy of the GitHub {name} JSON schema.")
+        sys.exit(1)
+    logging.info(f"Using the bundled GitHub {name} JSON schema.")
+    return snapshot
+
+
+def compile_schema(schema: dict, check: bool = True) -> "jsonschema.protocols.Validator":
+    """
+    Check a schema against its metaschema and build a reusable validator for it.
+    :param schema: the schema
+    :param check: False to skip the metaschema check of an already checked schema
+    :return: the validator
+    """
+
+    import jsonschema
+
+    validator_class = jsonschema.validators.validator_for(schema)
+    if check:
+        validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def init_worker(schemas: Dict[str, dict]) -> None:
+    """
+    Compile the schemas once in a validation process.
+    :param schemas: the checked schemas by name
+    :return: None
+    """
+
+    for name, schema in schemas.items():
+        validators[name] = compile_schema(schema, check=False)
+
+
+def get_loader(typ: str) -> "YAML":
+    """
+    Get a YAML loader, ruamel.yaml is only imported once a file has to be loaded.
+    :param typ: the loader type, 'safe' or 'rt' for the round-trip loader that keeps line numbers
+    :return: the loader
+    """
+
+    if typ not in loaders:
+        from ruamel.yaml import YAML
+
+        loaders[typ] = YAML(typ=typ)
+    return loaders[typ]
+
+
+def find_line(node, path: list) -> Optional[int]:
+    """
+    Find the line of the deepest part of a JSON path that exists in a YAML document.
+    :param node: the document loaded with the round-trip loader, which keeps line numbers
+    :param path: the path elements, keys and list indexes
+    :return: the 1-based line number or None if it can't be found
+    """
+
+    line = None
+    for element in path:
+        try:
+            if isinstance(element, int):
+                line = node.lc.item(element)[0] + 1
+            else:
+                line = node.lc.key(element)[0] + 1
+            node = node[element]
+        except (AttributeError, KeyError, IndexError, TypeError):
+            break
+    return line
+
+
+def validate_file(file: str, schema_name: str) -> List[SchemaViolation]:
+    """
+    Validate a YAML file and collect every schema violation.
+    :param file: the YAML file
+    :param schema_name: the name of the schema to validate against
+    :return: the violations, empty if the file is valid
+    """
+
+    try:
+        with open(file) as stream:
+            data_loaded = get_loader('safe').load(stream)
+    except Exception as e:
+        return [SchemaViolation(file, "$", f"Can't load YAML: {e}")]
+    logging.debug(f"Data loaded:\n{data_loaded}")
+    errors = list(validators[schema_name].iter_errors(data_loaded))
+    if not errors:
+        return []
+    # Only files with violations are loaded again to find the lines:
+    try:
+        with open(file) as stream:
+            document = get_loader('rt').load(stream)
+    except Exception:
+        document = None
+    return [SchemaViolation(file, error.json_path, error.message, find_line(document, list(error.absolute_path)))
+            for error in errors]
+
+
+def hash_schema(schema: dict) -> str:
+    """
+    Hash a schema independently of its key order.
+    :param schema: the schema
+    :return: the hex digest
+    """
+
+    return hashlib.sha256(json.dumps(schema, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def hash_file(file: str) -> str:
+    """
+    Hash the contents of a file.
+    :param file: the file
+    :return: the hex digest, empty if the file can't be read
+    """
+
+    try:
+        with open(file, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return ""
+
+
+def validate_schemas(targets: List[Tuple[str, str]], schemas: Dict[str, dict], jobs: int = None,
+                     results_cache: Dict[str, list] = None, prune: bool = False) -> List[SchemaViolation]:
+    """
+    Validates the schemas for the found YAML files
+    :param targets: the files and the names of the schemas to validate them against
+    :param schemas: the checked schemas by name
+    :param jobs: the number of validation processes, 1 to validate in this process
+    :param results_cache: cached violations by schema and file hash, updated with the new results
+    :param prune: True to drop the cached results of files that aren't among the targets
+    :return: the violations of every file, sorted by file, JSON path and message
+    """
+    violations = []
+    pending = []
+    used_keys = set()
+    if results_cache is None:
+        pending = [(file, schema_name, "") for file, schema_name in targets]
+    else:
+        schema_hashes = {name: hash_schema(schema) for name, schema in schemas.items()}
+        for file, schema_name in targets:
+            file_hash = hash_file(file)
+            key = f"{schema_hashes[schema_name]}:{file_hash}"
+            used_keys.add(key)
+            if file_hash and key in results_cache:
+                violations.extend(SchemaViolation(file, *cached) for cached in results_cache[key])
+            else:
+                pending.append((file, schema_name, key if file_hash else ""))
+    logging.info(f"Validating {len(pending)} GitHub files, {len(targets) - len(pending)} unchanged")
+
+    results = []
+    if jobs == 1 or len(pending) < 2:
+        init_worker(schemas)
+        results = [validate_file(file, schema_name) for file, schema_name, _ in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(schemas,)) as executor:
+            results = list(executor.map(validate_file, [file for file, _, _ in pending],
+                                        [schema_name for _, schema_name, _ in pending]))
+    for (_, _, key), result in zip(pending, results):
+        violations.extend(result)
+        if results_cache is not None and key:
+            results_cache[key] = [[violation.path, violation.message, violation.line] for violation in result]
+    if results_cache is not None and prune:
+        for key in set(results_cache) - used_keys:
+            del results_cache[key]
+    return sorted(violations, key=lambda violation: (violation.file, violation.path, violation.message))
+
+
+def read_changed_paths(path: str, root: str = None) -> set:
+    """
+    Read a list of changed paths, one per line.
+    :param path: the file listing the paths, '-' for stdin
+    :param root: the directory the paths are relative to, defaults to the current directory
+    :return: the absolute paths
+    """
+
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    return {os.path.abspath(os.path.join(root or ".", line.strip())) for line in lines if line.strip()}
+
+
+def escape_annotation(value: str, is_property: bool = False) -> str:
+    """
+    Escape a value for a GitHub workflow command.
+    :param value: the value
+    :param is_property: True for a property value, which also escapes ':' and ','
+    :return: the escaped value
+    """
+
+    value = value.replace("%", "%25").replace("\r", "%0D").replace("\n", "%0A")
+    if is_property:
+        value = value.replace(":", "%3A").replace(",", "%2C")
+    return value
+
+
+def report(violations: List[SchemaViolation], annotations_path: str = None, annotations_root: str = None) -> None:
+    """
+    Log the violations and optionally write them as GitHub annotations.
+    :param violations: the sorted violations
+    :param annotations_path: the file to write the ::error workflow commands to
+    :param annotations_root: the repository root the annotated file paths are made relative to
+    :return: None
+    """
+
+    for violation in violations:
+        location = f"{violation.file}:{violation.line}" if violation.line else violation.file
+        logging.error(f"{location}: {violation.path}: {violation.message}")
+    if annotations_path:
+        with open(annotations_path, "w") as f:
+            for violation in violations:
+                file = os.path.relpath(violation.file, annotations_root) if annotations_root else violation.file
+                properties = f"file={escape_annotation(file, True)}"
+                if violation.line:
+                    properties += f",line={violation.line}"
+                properties += f",title={escape_annotation('Schema violation at ' + violation.path, True)}"
+                f.write(f"::error {properties}::{escape_annotation(violation.message)}\n")
+
+
+# Main:
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="slate-gitops schema-validate",
+                                     description="Validate GitHub action and workflow files against their schemas")
+    parser.add_argument("--offline", action="store_true",
+                        help="don't download the schemas, use the cached or bundled copies")
+    parser.add_argument("--update-snapshot", action="store_true",
+                        help=f"write the schemas to {SCHEMA_SNAPSHOT_DIR} and exit")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="number of validation processes, defaults to the number of CPUs")
+    parser.add_argument("--annotations", metavar="FILE",
+                        help="write the violations as GitHub ::error workflow commands to FILE")
+    parser.add_argument("--annotations-root", metavar="DIR",
+                        help="repository root the annotated and changed file paths are relative to")
+    parser.add_argument("--changed-only", metavar="FILE",
+                        help="only validate the paths listed in FILE ('-' for stdin), e.g. from git diff --name-only")
+    parser.add_argument("--no-results-cache", action="store_true",
+                        help=f"validate every file again instead of using the results in {SCHEMA_RESULTS_CACHE}")
+    args = parser.parse_args()
+
+    if args.update_snapshot:
+        for schema_name in SCHEMA_URLS:
+            write_json(os.path.join(SCHEMA_SNAPSHOT_DIR, f"{schema_name}.json"),
+                       get_jsonschema(schema_name, args.offline))
+        logging.info(f"Updated the bundled schemas in: {SCHEMA_SNAPSHOT_DIR}")
+        sys.exit(0)
+
+    github_yaml_path = os.environ.get('GITHUB_YAML_PATH')
+    schemas = {}
+    for schema_name in SCHEMA_URLS:
+        schemas[schema_name] = get_jsonschema(schema_name, args.offline)
+        compile_schema(schemas[schema_name])
+
+    # Action files:
+    action_path = os.path.join(github_yaml_path, "actions", "**", "*.yml")
+    logging.info(f"Validating GitHub action files at: {action_path}")
+    action_files = find_files(action_path)
+    logging.info(f"Found the GitHub files:\n{action_files}")
+
+    # Workflow files:
+    workflow_path = os.path.join(github_yaml_path, "workflows", "*.yml")
+    logging.info(f"Validating GitHub workflow files at: {workflow_path}")
+    workflow_files = find_files(workflow_path)
+    logging.info(f"Found the GitHub files:\n{workflow_files}")
+
+    validation_targets = [(file, "github-action") for file in action_files] + \
+                         [(file, "github-workflow") for file in workflow_files]
+    if args.changed_only:
+        changed_paths = read_changed_paths(args.changed_only, args.annotations_root)
+        validation_targets = [(file, schema_name) for file, schema_name in validation_targets
+                              if os.path.abspath(file) in changed_paths]
+        logging.info(f"Only validating the {len(validation_targets)} changed GitHub files")
+
+    results = None if args.no_results_cache else (read_json(SCHEMA_RESULTS_CACHE) or {})
+    found_violations = validate_schemas(validation_targets, schemas, args.jobs, results,
+                                        prune=not args.changed_only)
+    if results is not None:
+        try:
+            write_json(SCHEMA_RESULTS_CACHE, results)
+        except OSError as e:
+            logging.warning(f"Can't write the results cache {SCHEMA_RESULTS_CACHE}: {e}")
+    report(found_violations, args.annotations, args.annotations_root)
+    if found_violations:
+        logging.error(f"Found {len(found_violations)} schema violations in "
+                      f"{len({violation.file for violation in found_violations})} files.")
+        sys.exit(1)
+
+    logging.info("SUCCESS!")
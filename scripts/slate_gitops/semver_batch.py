@@ -0,0 +1,139 @@
+"""
+This is a script to compare and bump the ``appVersion`` of many charts in one step. It appends $GITHUB_OUTPUT
+with a ``results`` key holding a JSON map from ``namespace/release`` to the outcome for that release::
+
+    {"staging/portal-staging": {"chart": "...", "release": "portal-staging", "namespace": "staging",
+                                "source": "1.2.0", "deployed": "1.1.9", "ahead": true, "version": "1.2.0"}}
+
+``version`` is the source appVersion when it is ahead of the deployed one and otherwise the bumped deployed
+appVersion, the same as ``semver-compare`` followed by ``semver-bump``. Releases in the production namespace
+are never bumped. A release that can't be found gets an ``error`` instead and makes the script fail after the
+output is written.
+
+The manifest is a YAML (or JSON) list of entries::
+
+    - chart: ./resources/chart
+      release: portal-staging
+      namespace: staging
+
+An entry can give the source appVersion as ``source`` instead of the ``chart`` to read it from, e.g. when the
+workflow has already worked it out as ``RELEASE_VERSION``.
+
+The deployed versions of all releases are fetched with a single Helm call through ``helm_releases.py``.
+
+This script uses the following system environmental variables as inputs:
+
+* ``SEMVER_MANIFEST``: path to the manifest, unless given as the first argument.
+* ``PRERELEASE_DATETIME_SUFFIX``: datetime object to apply as pre-release suffix in the development namespace.
+
+Additionally, the tools installed and configured by the GitHub composite action
+``gcloud-helm-setup/action.yml`` are required.
+"""
+
+import json
+import logging
+import os
+import sys
+import yaml
+
+from .chart_versions import bump_version, is_ahead, read_app_version
+from .helm_releases import index_releases, list_releases
+
+# Set up logging:
+if 'DEBUG' in os.environ and os.environ['DEBUG'] == 'TRUE':
+    logging.getLogger().setLevel(logging.DEBUG)
+else:
+    logging.getLogger().setLevel(logging.INFO)
+
+
+def result_key(entry: dict) -> str:
+    """
+    Get the key of a manifest entry in the results, releases are only unique within a namespace.
+    :param entry: the manifest entry
+    :return: the namespace and release name as ``namespace/release``
+    """
+
+    return f"{entry['namespace']}/{entry['release']}"
+
+
+def read_manifest(path: str) -> list:
+    """
+    Read the manifest of charts and releases.
+    :param path: the manifest file
+    :return: the list of entries with release, namespace and chart or source keys
+    """
+
+    with open(path) as stream:
+        entries = yaml.safe_load(stream) or []
+    seen = set()
+    for entry in entries:
+        missing = {'release', 'namespace'} - set(entry)
+        if missing:
+            raise ValueError(f"Manifest entry {entry} is missing: {', '.join(sorted(missing))}")
+        if 'chart' not in entry and 'source' not in entry:
+            raise ValueError(f"Manifest entry {entry} has neither a chart nor a source appVersion")
+        key = result_key(entry)
+        if key in seen:
+            raise ValueError(f"Manifest lists the release {key} more than once")
+        seen.add(key)
+    return entries
+
+
+def process_entries(entries: list, prerelease_datetime_suffix: str = None) -> dict:
+    """
+    Compare and bump the appVersion of every manifest entry.
+    :param entries: the manifest entries
+    :param prerelease_datetime_suffix: strftime format of the development pre-release suffix
+    :return: the results by ``namespace/release``
+    """
+
+    namespaces = {entry['namespace'] for entry in entries}
+    # One Helm call, for a single namespace when possible:
+    releases = index_releases(list_releases(namespaces.pop() if len(namespaces) == 1 else None))
+
+    results = {}
+    for entry in entries:
+        name, namespace = entry['release'], entry['namespace']
+        result = {'release': name, 'namespace': namespace}
+        if 'chart' in entry:
+            result['chart'] = entry['chart']
+        results[result_key(entry)] = result
+        try:
+            source_appversion = str(entry['source']) if 'source' in entry else read_app_version(entry['chart'])
+        except (OSError, KeyError, yaml.YAMLError) as ex:
+            result['error'] = f"Can't read the appVersion of {entry['chart']}: {ex}"
+            logging.error(result['error'])
+            continue
+        release = releases.get((namespace, name))
+        if release is None:
+            result['error'] = f"No Helm release named {name} in the {namespace} namespace."
+            logging.error(result['error'])
+            continue
+
+        deployed_appversion = release['app_version']
+        ahead = is_ahead(source_appversion, deployed_appversion)
+        if ahead or namespace == 'production':
+            version = source_appversion
+        else:
+            version = bump_version(deployed_appversion, namespace, prerelease_datetime_suffix)
+        result.update({'source': source_appversion, 'deployed': deployed_appversion, 'ahead': ahead,
+                       'version': version})
+        logging.info(f"{namespace}/{name}: source appVersion {source_appversion}, " +
+                     f"deployed appVersion {deployed_appversion}, {'ahead' if ahead else 'not ahead'}, " +
+                     f"appVersion to apply: {version}")
+    return results
+
+
+# Main:
+if __name__ == '__main__':
+    manifest_path = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('SEMVER_MANIFEST')
+    if not manifest_path:
+        logging.error("No manifest given, pass it as the first argument or set SEMVER_MANIFEST.")
+        sys.exit(1)
+
+    batch_results = process_entries(read_manifest(manifest_path), os.environ.get('PRERELEASE_DATETIME_SUFFIX'))
+    with open(os.environ['GITHUB_OUTPUT'], 'a') as filehandler:
+        print(f"results={json.dumps(batch_results, sort_keys=True)}", file=filehandler)
+
+    if any('error' in result for result in batch_results.values()):
+        sys.exit(1)
@@ -0,0 +1,54 @@
+"""
+This is a script to append $GITHUB_OUTPUT with a key-value pair describing the bumped semantic version in the
+repository's ``Chart.yaml``, specifically the ``appVersion`` metadata.
+
+This script uses the following system environmental variables as inputs:
+
+* ``RELEASE_VERSION``: derived from the repository's ``Chart.yaml``, specifically the ``appVersion``
+  metadata (calculated by the GitHub workflow).
+* ``HELM_RELEASE_NAMESPACE``: specified as input to the GitHub workflow.
+* ``HELM_RELEASE_NAMESPACE_SHORTHAND``: derived from ``HELM_RELEASE_NAMESPACE`` by the GitHub workflow.
+* ``HELM_RELEASE_PREFIX``: specified as input to the GitHub workflow.
+* ``PRERELEASE_DATETIME_SUFFIX``: datetime object to apply as pre-release suffix
+
+The deployed release is looked up through ``helm_releases.py``, which runs Helm at most once per job.
+
+Additionally, the tools installed and configured by the GitHub composite action
+``gcloud-helm-setup/action.yml`` are required.
+"""
+
+import logging
+import os
+
+from .chart_versions import bump_version
+from .helm_releases import find_release
+
+# Set up logging:
+if 'DEBUG' in os.environ and os.environ['DEBUG'] == 'TRUE':
+    logging.getLogger().setLevel(logging.DEBUG)
+else:
+    logging.getLogger().setLevel(logging.INFO)
+
+# Main:
+if __name__ == '__main__':
+    helm_release_namespace = os.environ.get('HELM_RELEASE_NAMESPACE')
+    helm_release_namespace_shorthand = os.environ.get('HELM_RELEASE_NAMESPACE_SHORTHAND')
+    helm_release_prefix = os.environ.get('HELM_RELEASE_PREFIX')
+    prerelease_datetime_suffix = os.environ.get('PRERELEASE_DATETIME_SUFFIX')
+
+    if helm_release_namespace == 'production':
+        raise Exception("This script is not appropriate for the production environment.")
+
+    helm_release_name = helm_release_prefix + '-' + helm_release_namespace_shorthand
+    logging.info(
+        f"Discovering deployed appVersion for Helm release {helm_release_name}" +
+        f" in the {helm_release_namespace} namespace..."
+    )
+    deployed_appversion = find_release(helm_release_name, helm_release_namespace)['app_version']
+    logging.info(f"Found deployed appVersion: {deployed_appversion}")
+
+    app_version = bump_version(deployed_appversion, helm_release_namespace, prerelease_datetime_suffix)
+
+    logging.info(f"New appVersion to apply: {app_version}")
+    with open(os.environ['GITHUB_OUTPUT'], 'a') as filehandler:
+        print(f"version={app_version}", file=filehandler)
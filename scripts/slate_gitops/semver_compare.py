@@ -1,5 +1,3 @@
-#!/usr/bin/env python
-
 """
 This is a script to append $GITHUB_OUTPUT with a key-value pair describing whether a deployed semantic version
 is newer than its counterpart in the repository's ``Chart.yaml``, specifically the ``appVersion``
@@ -13,16 +11,18 @@ This script uses the following system environmental variables as inputs:
 * ``HELM_RELEASE_NAMESPACE_SHORTHAND``: derived from ``HELM_RELEASE_NAMESPACE`` by the GitHub workflow.
 * ``HELM_RELEASE_PREFIX``: specified as input to the GitHub workflow.
 
+The deployed release is looked up through ``helm_releases.py``, which runs Helm at most once per job.
+
 Additionally, the tools installed and configured by the GitHub composite action
 ``gcloud-helm-setup/action.yml`` are required.
 """
 
 import logging
 import os
-import subprocess
 import semver
-import yaml
-from yaml.loader import SafeLoader
+
+from .chart_versions import is_ahead
+from .helm_releases import find_release
 
 # Set up logging:
 if 'DEBUG' in os.environ and os.environ['DEBUG'] == 'TRUE':
@@ -37,29 +37,13 @@ if __name__ == '__main__':
     helm_release_namespace_shorthand = os.environ.get('HELM_RELEASE_NAMESPACE_SHORTHAND')
     helm_release_prefix = os.environ.get('HELM_RELEASE_PREFIX')
 
-    command = [
-        'helm', 'list',
-        '-n', helm_release_namespace,
-        '--filter', helm_release_prefix + '-' + helm_release_namespace_shorthand,
-        '--output', 'yaml'
-    ]
-
+    helm_release_name = helm_release_prefix + '-' + helm_release_namespace_shorthand
     logging.info(
-        f"Discovering deployed appVersion for Helm release {helm_release_prefix}-{helm_release_namespace_shorthand}" +
+        f"Discovering deployed appVersion for Helm release {helm_release_name}" +
         f" in the {helm_release_namespace} namespace..."
     )
-    try:
-        result = subprocess.run(command,
-                                stdout=subprocess.PIPE,
-                                check=True,
-                                text=True
-                                ).stdout
-        logging.debug(f"Raw result from Helm:\n{result}")
-        data = yaml.load(result, Loader=SafeLoader)
-        deployed_appversion = data[0]['app_version']
-        logging.info(f"Found deployed appVersion: {deployed_appversion}")
-    except subprocess.CalledProcessError as ex:
-        raise ex
+    deployed_appversion = find_release(helm_release_name, helm_release_namespace)['app_version']
+    logging.info(f"Found deployed appVersion: {deployed_appversion}")
 
     logging.info("Discovering appVersion from source...")
     logging.info(f"Found appVersion from source: {discovered_appversion}")
@@ -68,7 +52,7 @@ if __name__ == '__main__':
     comparison = semver.compare(deployed_appversion, discovered_appversion)
     logging.debug(f"Raw semver comparison result: {comparison}")
 
-    if semver.compare(discovered_appversion, deployed_appversion) < 1:
+    if not is_ahead(discovered_appversion, deployed_appversion):
         logging.info(
             f"The source appVersion \"{discovered_appversion}\" in Chart.yaml is not ahead" +
             f" of the deployed appVersion \"{deployed_appversion}\"."
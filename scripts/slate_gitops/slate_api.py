@@ -0,0 +1,428 @@
+"""
+Shared client for the SLATE API used by the GitOps automation scripts.
+
+All calls go through a single pooled ``requests.Session`` so connections are kept
+alive between requests. Failed calls are retried with capped exponential backoff
+plus jitter until a total deadline is reached.
+
+This module uses the following optional system environmental variables:
+
+* ``SLATE_API_DEADLINE``: total number of seconds a call (including retries) may take, defaults to 120.
+* ``SLATE_API_MAX_DELAY``: cap in seconds on a single backoff delay, defaults to 15.
+"""
+
+import json as _json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Collection, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_VERSION = "v1alpha3"
+
+# Status codes worth retrying for calls that can safely be repeated
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Status codes that mean the server did not act on the request at all
+RETRY_STATUSES_UNSAFE = frozenset({429, 503})
+
+
+class SlateAPIError(Exception):
+    """
+    Raised when the SLATE API can't be reached before the deadline
+    """
+
+
+class CallRecord(NamedTuple):
+    """
+    Measurements for one SLATE API call, including all of its retries
+
+    status is 0 when no response was received.
+    """
+    operation: str
+    cluster: str
+    method: str
+    path: str
+    status: int
+    latency: float
+    bytes_sent: int
+    retries: int
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of a list of values
+
+    :param values: the values, need not be sorted
+    :param fraction: percentile as a fraction, e.g. 0.95
+    :return: the percentile or 0.0 for an empty list
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(fraction * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class ApiMetrics:
+    """
+    Thread-safe collector of CallRecord measurements
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: List[CallRecord] = []
+
+    def record(self, call: CallRecord) -> None:
+        """
+        Add the measurements of a finished call
+
+        :param call: the measurements
+        """
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> List[dict]:
+        """
+        Aggregate the calls by operation and cluster
+
+        :return: one dict per (operation, cluster) pair, sorted by operation then cluster
+        """
+        groups: Dict[Tuple[str, str], List[CallRecord]] = {}
+        with self._lock:
+            for call in self.calls:
+                groups.setdefault((call.operation, call.cluster), []).append(call)
+        rows = []
+        for (operation, cluster), calls in sorted(groups.items()):
+            latencies = [call.latency for call in calls]
+            rows.append({"operation": operation,
+                         "cluster": cluster,
+                         "calls": len(calls),
+                         "errors": sum(1 for call in calls if not 200 <= call.status < 300),
+                         "retries": sum(call.retries for call in calls),
+                         "bytes_sent": sum(call.bytes_sent for call in calls),
+                         "p50": percentile(latencies, 0.5),
+                         "p95": percentile(latencies, 0.95),
+                         "max": max(latencies)})
+        return rows
+
+    def summary_markdown(self) -> str:
+        """
+        Render the summary as a GitHub flavoured markdown table
+
+        :return: markdown text
+        """
+        lines = ["## SLATE API calls", ""]
+        rows = self.summary()
+        if not rows:
+            return "\n".join(lines + ["No SLATE API calls were made.", ""])
+        lines.append("| Operation | Cluster | Calls | Errors | Retries | Bytes sent | p50 (s) | p95 (s) | max (s) |")
+        lines.append("|---|---|---:|---:|---:|---:|---:|---:|---:|")
+        for row in rows:
+            lines.append(f"| {row['operation']} | {row['cluster'] or '-'} | {row['calls']} | {row['errors']} "
+                         f"| {row['retries']} | {row['bytes_sent']} | {row['p50']:.3f} | {row['p95']:.3f} "
+                         f"| {row['max']:.3f} |")
+        return "\n".join(lines + [""])
+
+    def write_json(self, path: str) -> None:
+        """
+        Write every call and the summary as JSON
+
+        :param path: file to write
+        """
+        with self._lock:
+            calls = [call._asdict() for call in self.calls]
+        with open(path, "w") as f:
+            _json.dump({"calls": calls, "summary": self.summary()}, f, indent=2)
+
+
+def backoff_delays(base: float = 0.5, cap: float = 15.0) -> Iterator[float]:
+    """
+    Generate capped exponential backoff delays with equal jitter
+
+    :param base: delay before the first retry
+    :param cap: upper bound on any single delay
+    :return: iterator of delays in seconds
+    """
+    attempt = 0
+    while True:
+        delay = min(cap, base * 2 ** attempt)
+        yield delay / 2 + random.uniform(0, delay / 2)
+        attempt += 1
+
+
+class SlateClient:
+    """
+    Pooled, retrying client for the SLATE API
+    """
+
+    def __init__(self, endpoint: str, token: str, pool_size: int = 10, deadline: float = None,
+                 max_delay: float = None, timeout: tuple = (10, 60), metrics: ApiMetrics = None):
+        """
+        :param endpoint: base URL of the SLATE API server
+        :param token: SLATE API token
+        :param pool_size: number of connections to keep open, should match the number of workers
+        :param deadline: total seconds allowed for one call including retries
+        :param max_delay: cap in seconds on a single backoff delay
+        :param timeout: (connect, read) timeout for each attempt
+        :param metrics: collector for per-call measurements
+        """
+        self.metrics = metrics if metrics is not None else ApiMetrics()
+        self.endpoint = endpoint.rstrip("/")
+        self.token = token
+        self.deadline = deadline if deadline is not None else float(os.environ.get("SLATE_API_DEADLINE", 120))
+        self.max_delay = max_delay if max_delay is not None else float(os.environ.get("SLATE_API_MAX_DELAY", 15))
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self) -> None:
+        """
+        Close all pooled connections
+        """
+        self.session.close()
+
+    def request(self, method: str, path: str, params: dict = None, json: dict = None,
+                idempotent: bool = True, operation: str = "", cluster: str = "") -> requests.Response:
+        """
+        Send a request to the SLATE API, retrying transient failures
+
+        :param method: HTTP method
+        :param path: path below the API endpoint, e.g. /v1alpha3/instances
+        :param params: extra query parameters, the token is always added
+        :param json: JSON body
+        :param idempotent: False if repeating the call could apply it twice
+        :param operation: operation name recorded in the metrics, e.g. update
+        :param cluster: cluster recorded in the metrics
+        :return: the last response received
+        """
+        uri = f"{self.endpoint}{path}"
+        query = {"token": self.token}
+        if params:
+            query.update(params)
+        body = None if json is None else _json.dumps(json).encode("utf-8")
+        headers = {} if body is None else {"Content-Type": "application/json"}
+        retry_statuses = RETRY_STATUSES if idempotent else RETRY_STATUSES_UNSAFE
+        started = time.monotonic()
+        give_up = started + self.deadline
+        delays = backoff_delays(cap=self.max_delay)
+        attempts = 0
+        response = None
+
+        def record() -> None:
+            self.metrics.record(CallRecord(operation or method, cluster, method, path,
+                                           response.status_code if response is not None else 0,
+                                           time.monotonic() - started,
+                                           attempts * len(body or b""), attempts - 1))
+
+        while True:
+            logging.debug(f"Contacting {method} {uri}")
+            attempts += 1
+            try:
+                response = self.session.request(method, uri, params=query, data=body, headers=headers,
+                                                timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response = None
+                if not idempotent and not isinstance(e, requests.ConnectTimeout):
+                    record()
+                    raise SlateAPIError(f"{method} {uri} failed: {e}") from e
+                logging.warning(f"{method} {uri} failed: {e}")
+            else:
+                logging.debug(f"Got {response} from the server: {response.text}")
+                if response.status_code not in retry_statuses:
+                    record()
+                    return response
+                logging.warning(f"Got a {response.status_code} from {method} {uri}")
+
+            delay = next(delays)
+            if response is not None and response.headers.get("Retry-After", "").isdigit():
+                delay = min(self.max_delay, float(response.headers["Retry-After"]))
+            if time.monotonic() + delay > give_up:
+                record()
+                if response is not None:
+                    return response
+                raise SlateAPIError(f"{method} {uri} did not succeed within {self.deadline}s")
+            logging.info(f"Retrying {method} {uri} in {delay:.1f}s")
+            time.sleep(delay)
+
+    def list_instances(self, cluster: str) -> Optional[list]:
+        """
+        List the instances running on a cluster
+
+        :param cluster: slate cluster to query
+        :return: list of instance items or None on error
+        """
+        response = self.request("POST", f"/{API_VERSION}/instances",
+                                params={"cluster": cluster},
+                                json={"apiVersion": API_VERSION, "cluster": cluster},
+                                operation="list", cluster=cluster)
+        if response.status_code != 200:
+            logging.error(f"Got a {response.status_code} while listing instances on {cluster}")
+            return None
+        return response.json().get("items", [])
+
+    def add_instance(self, app: str, group: str, cluster: str, configuration: str) -> requests.Response:
+        """
+        Install an application instance on a cluster
+
+        :param app: application name
+        :param group: slate group owning the instance
+        :param cluster: slate cluster to install on
+        :param configuration: contents of values.yaml
+        :return: the API response
+        """
+        return self.request("POST", f"/{API_VERSION}/apps/{app}",
+                            json={"apiVersion": API_VERSION,
+                                  "group": group,
+                                  "cluster": cluster,
+                                  "configuration": configuration},
+                            idempotent=False, operation="add", cluster=cluster)
+
+    def update_instance(self, instance_id: str, configuration: str, cluster: str = "") -> requests.Response:
+        """
+        Replace the configuration of an existing instance
+
+        :param instance_id: SLATE instance id
+        :param configuration: contents of values.yaml
+        :param cluster: cluster the instance runs on, for the metrics
+        :return: the API response
+        """
+        return self.request("PUT", f"/{API_VERSION}/instances/{instance_id}/update",
+                            json={"apiVersion": API_VERSION, "configuration": configuration},
+                            operation="update", cluster=cluster)
+
+
+class _Listing(NamedTuple):
+    fetched_at: float
+    index: Dict[Tuple[str, Optional[str]], List[str]]
+    ids: FrozenSet[str]
+
+
+class InstanceCache:
+    """
+    Per-run cache of instance listings, one per cluster
+
+    Each listing is indexed by (application, group) so lookups don't scan the items.
+    A cached listing is only refreshed while an add on its cluster is pending
+    resolution, and then at most once per polling round no matter how many adds
+    on that cluster are waiting.
+    """
+
+    def __init__(self, client: SlateClient):
+        """
+        :param client: client used to fetch listings
+        """
+        self.client = client
+        self._lock = threading.Lock()
+        self._cluster_locks: Dict[str, threading.Lock] = {}
+        self._listings: Dict[str, _Listing] = {}
+        self._pending = Counter()
+
+    def _cluster_lock(self, cluster: str) -> threading.Lock:
+        with self._lock:
+            return self._cluster_locks.setdefault(cluster, threading.Lock())
+
+    @contextmanager
+    def pending_add(self, cluster: str):
+        """
+        Mark an add on a cluster as waiting for its instance id
+
+        :param cluster: slate cluster the instance was added to
+        """
+        with self._lock:
+            self._pending[cluster] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending[cluster] -= 1
+
+    def _listing(self, cluster: str, since: float = None) -> Optional[_Listing]:
+        with self._cluster_lock(cluster):
+            cached = self._listings.get(cluster)
+            stale = since is not None and self._pending[cluster] > 0 and cached is not None \
+                and cached.fetched_at < since
+            if cached is None or stale:
+                fetched_at = time.monotonic()
+                items = self.client.list_instances(cluster)
+                if items is None:
+                    return None
+                index = {}
+                ids = set()
+                for item in items:
+                    metadata = item["metadata"]
+                    if metadata.get("id", "") == "":
+                        continue
+                    index.setdefault((metadata["application"], metadata.get("group")), []).append(metadata["id"])
+                    ids.add(metadata["id"])
+                cached = _Listing(fetched_at, index, frozenset(ids))
+                self._listings[cluster] = cached
+        return cached
+
+    def fetch(self, cluster: str) -> bool:
+        """
+        Make sure the listing of a cluster is cached
+
+        :param cluster: slate cluster to query
+        :return: False if the cluster's instances can't be listed
+        """
+        return self._listing(cluster) is not None
+
+    def lookup(self, cluster: str, app: str, group: str = None, since: float = None,
+               exclude: Collection[str] = ()) -> Optional[str]:
+        """
+        Find the id of an instance of an application on a cluster
+
+        :param cluster: slate cluster to query
+        :param app: application name
+        :param group: slate group owning the instance
+        :param since: time.monotonic() value, refresh a listing fetched before it if an add is pending
+        :param exclude: ids to skip, e.g. those of instances that were running before an add
+        :return: instance id or None if the instance isn't listed
+        """
+        listing = self._listing(cluster, since)
+        if listing is None:
+            return None
+        # Fall back to listings that don't report the group
+        for key in ((app, group), (app, None)):
+            for instance_id in listing.index.get(key, ()):
+                if instance_id not in exclude:
+                    return instance_id
+        return None
+
+    def instance_ids(self, cluster: str, app: str = None, group: str = None) -> Optional[FrozenSet[str]]:
+        """
+        Get the ids of the instances SLATE lists on a cluster
+
+        :param cluster: slate cluster to query
+        :param app: only get the ids lookup() could return for this application and group
+        :param group: slate group owning the instances
+        :return: the ids, None if the cluster's instances can't be listed
+        """
+        listing = self._listing(cluster)
+        if listing is None:
+            return None
+        if app is None:
+            return listing.ids
+        return frozenset(listing.index.get((app, group), []) + listing.index.get((app, None), []))
+
+    def is_listed(self, cluster: str, instance_id: str) -> Optional[bool]:
+        """
+        Check whether SLATE lists an instance on a cluster
+
+        :param cluster: slate cluster to query
+        :param instance_id: SLATE instance id
+        :return: True or False, None if the cluster's instances can't be listed
+        """
+        listing = self._listing(cluster)
+        if listing is None:
+            return None
+        return instance_id in listing.ids